@@ -0,0 +1,119 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import sys
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from main import Budget, Verdict, verify_program
+from parser_1 import *
+from typing import Any, List, Optional, Tuple
+
+# The engines are imported before the workers are forked, so no verification pays for importing them
+import merging
+import tiered
+
+# asyncio API of the engines.
+# Verifying runs on worker processes, so neither the engines nor z3 ever block the event loop:
+#     async with AsyncVerifier(jobs=4) as verifier:
+#         verdict, counterexample = await verifier.verify(program, timeout=1, budget=10)
+# timeout limits each z3 query and budget the whole program (main.Budget), a program that runs out
+# of either is "unknown". Cancelling the awaiting task cancels the verification - one that hasn't
+# started is dropped, a running one is told through a flag in shared memory and stops at its next
+# query. Every running verification has its own flag, so at most slots of them are submitted at a time.
+
+# Seconds a worker gets past the budget to notice it's out of time, before its verdict is given up on
+GRACE = 1.0
+
+# Cancellation flags of the verifications, shared with the workers
+flags: Optional[Any] = None
+
+
+def init_worker(shared_flags: Any) -> None:
+    global flags
+    flags = shared_flags
+
+
+def is_cancelled(slot: int) -> bool:
+    '''
+    Worker side - check the flag of the verification in slot
+    '''
+    return flags[slot] != 0
+
+
+class AsyncVerifier:
+    '''
+    Verifies programs on jobs worker processes, at most slots (default 4 per worker) of them at a time
+    '''
+    def __init__(self, jobs: int = os.cpu_count() or 1, slots: Optional[int] = None):
+        self.slots: int = slots or 4 * jobs
+        self.flags: Any = multiprocessing.RawArray('b', self.slots)
+        self.free: List[int] = list(range(self.slots))
+        self.available: asyncio.Semaphore = asyncio.Semaphore(self.slots)
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(self.flags,))
+
+    async def verify(self, program: Program, engine: str = "paths", prune_every: int = 0,
+                     passes: Tuple[str, ...] = (), timeout: Optional[float] = None,
+                     budget: Optional[float] = None) -> Verdict:
+        '''
+        Verify program like main.verify_program, timeout seconds for each z3 query and budget seconds for all of it
+        '''
+        await self.available.acquire()
+        slot: int = self.free.pop()
+        self.flags[slot] = 0
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        limits: Budget = Budget(timeout, budget, functools.partial(is_cancelled, slot))
+        job: Future = self.executor.submit(verify_program, program, engine, prune_every, 1, passes, limits)
+
+        def done(_: Future) -> None:
+            # The slot is only reused once its worker is done with it
+            try:
+                loop.call_soon_threadsafe(self.release, slot)
+            except RuntimeError:
+                # The event loop is closed
+                pass
+        job.add_done_callback(done)
+
+        try:
+            if budget is None:
+                return await self.wait(job, slot)
+            return await asyncio.wait_for(self.wait(job, slot), budget + GRACE)
+        except asyncio.TimeoutError:
+            return "unknown", None
+
+    async def wait(self, job: Future, slot: int) -> Verdict:
+        try:
+            return await asyncio.wrap_future(job)
+        except asyncio.CancelledError:
+            self.flags[slot] = 1
+            job.cancel()
+            raise
+
+    def release(self, slot: int) -> None:
+        self.free.append(slot)
+        self.available.release()
+
+    def close(self) -> None:
+        # The running verifications stop at their next query instead of running to the end
+        for slot in range(self.slots):
+            self.flags[slot] = 1
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def __aenter__(self) -> 'AsyncVerifier':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+async def verify_files(filenames: List[str], engine: str, timeout: Optional[float],
+                       budget: Optional[float]) -> List[Verdict]:
+    async with AsyncVerifier() as verifier:
+        return await asyncio.gather(*(verifier.verify(parse_file(filename), engine, timeout=timeout, budget=budget)
+                                      for filename in filenames))
+
+
+if __name__ == "__main__":
+    files: List[str] = sys.argv[1:]
+    for filename, (verdict, _) in zip(files, asyncio.run(verify_files(files, "paths", None, None))):
+        print(filename, verdict)
@@ -0,0 +1,200 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from parser_1 import *
+from stats import collect
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Benchmark harness for the engines.
+# Generates random programs in the parser_1 grammar with a given number of variables, ifs,
+# body length and constant range, runs every engine on them and writes wall time, peak memory,
+# paths explored, solver calls and the other stats.py counters of every run to a JSON file,
+# so runs on different commits can be compared.
+
+COMP_OPS = ('==', '!=', '<', '>', '<=', '>=')
+
+
+def generate_program(rng: random.Random, variables: int, ifs: int, body_length: int,
+                     constants: Tuple[int, int] = (-10, 10), ops: Tuple[str, ...] = ('+', '-')) -> str:
+    '''
+    Generate the text of a random program.\n
+    Every variable gets an input() or a constant first, then each if is preceded by one assignment
+    and has body_length assignments in its body. Variables always stay on the left side of
+    expressions and conditions
+    '''
+    names: List[str] = [f"v{i}" for i in range(variables)]
+
+    def operand() -> str:
+        if rng.random() < 0.5:
+            return rng.choice(names)
+        return str(rng.randint(*constants))
+
+    def assignment() -> str:
+        lhs: str = rng.choice(names)
+        if rng.random() < 0.3:
+            return f"{lhs} = {operand()}"
+        op: str = rng.choice(ops)
+        # The engines only multiply by constants
+        rhs: str = str(rng.randint(*constants)) if op == '*' else operand()
+        return f"{lhs} = {rng.choice(names)} {op} {rhs}"
+
+    def condition() -> str:
+        return f"{rng.choice(names)} {rng.choice(COMP_OPS)} {operand()}"
+
+    lines: List[str] = []
+    for name in names:
+        lines.append(f"{name} = input()" if rng.random() < 0.7 else f"{name} = {rng.randint(*constants)}")
+    for _ in range(ifs):
+        lines.append(assignment())
+        lines.append(f"if {condition()} then")
+        lines.extend("    " + assignment() for _ in range(body_length))
+        lines.append("end")
+    lines.append(f"assert {condition()}")
+    return "\n".join(lines) + "\n"
+
+
+def run_paths(program: Program) -> bool:
+    import main
+    return main.is_assert_true(program, 0, {}, [])
+
+
+def run_merging(program: Program) -> bool:
+    import merging
+    return merging.is_assert_true(program)
+
+
+def run_sliced(program: Program) -> bool:
+    import main
+    import slicing
+    return main.is_assert_true(slicing.slice_program(program), 0, {}, [])
+
+
+def run_intervals(program: Program) -> bool:
+    import number_intervals
+    return number_intervals.main(program)
+
+
+def run_intervals_join(program: Program) -> bool:
+    import number_intervals
+    return number_intervals.main(program, "intervals", "join")
+
+
+def run_octagons(program: Program) -> bool:
+    import number_intervals
+    return number_intervals.main(program, "octagons")
+
+
+def run_tiered(program: Program) -> bool:
+    import tiered
+    return tiered.is_assert_true(program)
+
+
+ENGINES: Dict[str, Callable[[Program], bool]] = {
+    "paths": run_paths,
+    "merging": run_merging,
+    "sliced": run_sliced,
+    "intervals": run_intervals,
+    "intervals_join": run_intervals_join,
+    "octagons": run_octagons,
+    "tiered": run_tiered,
+}
+
+
+def measure(engine: str, text: str, memory: bool = True) -> Dict[str, Any]:
+    '''
+    Run one engine on a freshly parsed copy of the program.\n
+    The run that is timed is not instrumented, the counters (and peak memory) come from a second run
+    '''
+    run: Callable[[Program], bool] = ENGINES[engine]
+    record: Dict[str, Any] = {"engine": engine}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            program: Program = parse_text(text)
+            start: float = time.perf_counter()
+            record["result"] = run(program)
+            record["wall_time"] = time.perf_counter() - start
+
+            program = parse_text(text)
+            if memory:
+                tracemalloc.start()
+            _, recorded = collect(run, program)
+            if memory:
+                record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            record.update(recorded["counters"])
+            record["max_path_condition_length"] = recorded["maxima"]["path_condition_length"]
+            record["max_live_variables"] = recorded["maxima"]["live_variables"]
+            if recorded["maxima"]["sliced_paths_factor"]:
+                record["sliced_paths_factor"] = recorded["maxima"]["sliced_paths_factor"]
+    except Exception as e:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(",")]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the engines on generated programs.")
+    parser.add_argument("--variables", type=int_list, default=[3], help="comma separated numbers of variables")
+    parser.add_argument("--ifs", type=int_list, default=[1, 2, 4, 6, 8], help="comma separated numbers of ifs")
+    parser.add_argument("--body", type=int_list, default=[2], help="comma separated if body lengths")
+    parser.add_argument("--constants", type=int, nargs=2, default=[-10, 10], metavar=("MIN", "MAX"),
+                        help="range of the generated constants")
+    parser.add_argument("--multiply", action="store_true",
+                        help="also generate multiplications by constants")
+    parser.add_argument("--programs", type=int, default=5, help="programs generated for each configuration")
+    parser.add_argument("--engines", default="paths,intervals",
+                        help="comma separated engines out of " + ", ".join(ENGINES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="don't measure peak memory")
+    parser.add_argument("--output", "-o", default="benchmark.json", help="JSON file with the results")
+    args = parser.parse_args(argv)
+
+    engines: List[str] = args.engines.split(",")
+    ops: Tuple[str, ...] = ('+', '-', '*') if args.multiply else ('+', '-')
+    rng = random.Random(args.seed)
+    results: List[Dict[str, Any]] = []
+    for variables in args.variables:
+        for ifs in args.ifs:
+            for body in args.body:
+                for index in range(args.programs):
+                    text: str = generate_program(rng, variables, ifs, body, tuple(args.constants), ops)
+                    for engine in engines:
+                        record: Dict[str, Any] = {"variables": variables, "ifs": ifs, "body": body,
+                                                  "program": index}
+                        record.update(measure(engine, text, not args.no_memory))
+                        results.append(record)
+                        print(json.dumps(record), file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "seed": args.seed,
+            "constants": args.constants,
+            "results": results,
+        }, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
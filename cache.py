@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from parser_1 import *
+from typing import Dict, Optional, Tuple
+
+# Persistent cache of verdicts, keyed by a hash of the normalized program.
+# Programs that differ only in whitespace or in the names of their variables share one entry,
+# counterexamples are stored with the normalized names and renamed back on lookup.
+
+# Any change to these files can change verdicts, so the cache is dropped whenever they change
+ENGINE_FILES = ("parser_1.py", "main.py", "merging.py", "parallel.py", "number_intervals.py", "tiered.py", "linear.py", "ir.py",
+                "octagons.py", "slicing.py", "folding.py", "worklist.py")
+
+
+def engine_version() -> str:
+    digest = hashlib.sha256()
+    directory: str = os.path.dirname(os.path.abspath(__file__))
+    for filename in ENGINE_FILES:
+        path: str = os.path.join(directory, filename)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def normalize(program: Program) -> Tuple[str, Dict[str, str]]:
+    '''
+    Print the program with its variables renamed to v0, v1, ... in the order they first appear.\n
+    Returns the text and the renaming
+    '''
+    names: Dict[str, str] = {}
+
+    def value(x: Value) -> str:
+        if isinstance(x, str):
+            if x not in names:
+                names[x] = "v" + str(len(names))
+            return names[x]
+        return str(x)
+
+    def rhs(x: Union[Value, Expr]) -> str:
+        if isinstance(x, Expr):
+            return f"{value(x.l)} {x.op} {value(x.r)}"
+        return value(x)
+
+    def comp(condition: Comp) -> str:
+        return f"{value(condition.l)} {condition.op} {value(condition.r)}"
+
+    def assignment(command: Assignment) -> str:
+        lhs: str = value(command.lhs)
+        return f"{lhs} = {rhs(command.rhs)}"
+
+    lines: List[str] = []
+    for command in program.commands:
+        if isinstance(command, If):
+            lines.append(f"if {comp(command.condition)} then")
+            lines.extend(assignment(assignment_command) for assignment_command in command.body)
+            lines.append("end")
+        else:
+            lines.append(assignment(command))
+    lines.append(f"assert {comp(program.postCondition)}")
+    return "\n".join(lines), names
+
+
+def program_hash(program: Program) -> Tuple[str, Dict[str, str]]:
+    text, names = normalize(program)
+    return hashlib.sha256(text.encode()).hexdigest(), names
+
+
+class VerdictCache:
+    '''
+    SQLite store mapping normalized programs to their verdict and counterexample.\n
+    Holds at most max_entries programs, the least recently used ones are evicted first.\n
+    A hit only costs the hash and a lookup - the times programs were last used are kept in memory and
+    written together with the next put, or on close
+    '''
+    def __init__(self, filename: str, max_entries: int = 100000, version: Optional[str] = None):
+        self.connection: sqlite3.Connection = sqlite3.connect(filename)
+        self.max_entries: int = max_entries
+        # last_used of the programs found since the last write
+        self.used: Dict[str, int] = {}
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS verdicts (hash TEXT PRIMARY KEY, verdict TEXT, "
+                                "counterexample TEXT, last_used INTEGER)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+
+        version = version or engine_version()
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != version:
+            self.clear()
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+        self.connection.commit()
+        # At least the number of rows, a replaced row is counted again until the next eviction recounts
+        self.entries: int = len(self)
+
+    def get(self, program: Program) -> Optional[Tuple[str, Optional[Dict[str, int]]]]:
+        key, names = program_hash(program)
+        row = self.connection.execute("SELECT verdict, counterexample FROM verdicts WHERE hash = ?",
+                                      (key,)).fetchone()
+        if row is None:
+            return None
+        self.used[key] = time.time_ns()
+
+        verdict, counterexample = row
+        if counterexample is None:
+            return verdict, None
+        original: Dict[str, str] = {normalized: name for name, normalized in names.items()}
+        return verdict, {original.get(name, name): value for name, value in json.loads(counterexample).items()}
+
+    def put(self, program: Program, verdict: str, counterexample: Optional[Dict[str, int]] = None) -> None:
+        key, names = program_hash(program)
+        if counterexample is not None:
+            counterexample = {names.get(name, name): value for name, value in counterexample.items()}
+        self.write_used()
+        self.connection.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)",
+                                (key, verdict, None if counterexample is None else json.dumps(counterexample),
+                                 time.time_ns()))
+        self.entries += 1
+        if self.entries > self.max_entries:
+            # Evict a tenth more than needed, so a full cache isn't scanned on every put
+            self.connection.execute("DELETE FROM verdicts WHERE hash IN (SELECT hash FROM verdicts "
+                                    "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                                    (self.max_entries - self.max_entries // 10,))
+            self.entries = len(self)
+        self.connection.commit()
+
+    def write_used(self) -> None:
+        '''
+        Update last_used of the programs found since the last write, in the transaction of the caller
+        '''
+        if self.used:
+            self.connection.executemany("UPDATE verdicts SET last_used = ? WHERE hash = ?",
+                                        [(last_used, key) for key, last_used in self.used.items()])
+            self.used.clear()
+
+    def clear(self) -> None:
+        self.used.clear()
+        self.connection.execute("DELETE FROM verdicts")
+        self.connection.commit()
+        self.entries = 0
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def close(self) -> None:
+        self.write_used()
+        self.connection.commit()
+        self.connection.close()
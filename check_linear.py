@@ -0,0 +1,83 @@
+import argparse
+import random
+import sys
+
+import linear
+
+from typing import Dict, List, Optional, Tuple
+from z3 import Int, Solver, sat, unsat
+
+# Cross-check of linear.solve against z3.
+# Since PathSolver tries linear.solve before z3, most verdicts rest on linear.solve alone, in particular
+# on its claim that "unsatisfiable" is exact. This generates random small systems - with unit and
+# non-unit equations, inequalities with tight integer bounds and disequations that force splits - and
+# checks every decided system with z3: an unsatisfiable one must be unsat for z3 too, and the model of
+# a satisfiable one must satisfy every constraint. Run it after changing linear.py:
+#     python check_linear.py --systems 20000 --seed 1
+# Exits with 1 if any system was decided wrongly.
+
+OPS: Tuple[str, ...] = ('<=', '<=', '<=', '==', '!=')
+
+
+def random_system(rng: random.Random, variables: int, constraints: int, bound: int) -> List[linear.LinearConstraint]:
+    names: List[str] = [f"x{i}" for i in range(variables)]
+    system: List[linear.LinearConstraint] = []
+    for _ in range(constraints):
+        op: str = rng.choice(OPS)
+        used: List[str] = rng.sample(names, rng.randint(1, min(3, variables)))
+        # Unit coefficients are substituted away, the others go through the elimination and the gcd test
+        coefficients: Dict[str, int] = {name: rng.choice((1, -1, 2, -2, 3, -3, 4)) for name in used}
+        system.append((op, coefficients, rng.randint(-bound, bound)))
+    return system
+
+
+def holds(constraint: linear.LinearConstraint, model: linear.Model) -> bool:
+    op, coefficients, constant = constraint
+    total: int = linear.value((coefficients, constant), model)
+    return total <= 0 if op == '<=' else total == 0 if op == '==' else total != 0
+
+
+def z3_satisfiable(system: List[linear.LinearConstraint]) -> Optional[bool]:
+    solver: Solver = Solver()
+    for op, coefficients, constant in system:
+        total = sum(coefficient * Int(name) for name, coefficient in coefficients.items()) + constant
+        solver.add(total <= 0 if op == '<=' else total == 0 if op == '==' else total != 0)
+    result = solver.check()
+    return True if result == sat else False if result == unsat else None
+
+
+def check(systems: int, seed: int, max_variables: int, bound: int) -> Tuple[Dict[str, int], List[str]]:
+    '''
+    Check systems random systems, return how many were sat, unsat and undecided, and the wrong decisions
+    '''
+    rng: random.Random = random.Random(seed)
+    counts: Dict[str, int] = {"sat": 0, "unsat": 0, "undecided": 0}
+    wrong: List[str] = []
+    for _ in range(systems):
+        variables: int = rng.randint(1, max_variables)
+        system: List[linear.LinearConstraint] = random_system(rng, variables, rng.randint(1, 2 * variables + 2), bound)
+        result = linear.solve([(op, dict(coefficients), constant) for op, coefficients, constant in system])
+        if result is None:
+            counts["undecided"] += 1
+            continue
+        satisfiable, model = result
+        counts["sat" if satisfiable else "unsat"] += 1
+        if satisfiable and not all(holds(constraint, model) for constraint in system):
+            wrong.append(f"model {model} violates {system}")
+        elif satisfiable != z3_satisfiable(system):
+            wrong.append(f"{'sat' if satisfiable else 'unsat'} but not for z3: {system}")
+    return counts, wrong
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare linear.solve with z3 on random systems.")
+    parser.add_argument("--systems", type=int, default=5000, help="number of systems (default: 5000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variables", type=int, default=4, help="maximum number of variables of a system")
+    parser.add_argument("--bound", type=int, default=6, help="constants are between -bound and bound")
+    args = parser.parse_args()
+    counts, wrong = check(args.systems, args.seed, args.variables, args.bound)
+    for line in wrong[:10]:
+        print(line)
+    print(", ".join(f"{value} {name}" for name, value in counts.items()), f"- {len(wrong)} wrong")
+    sys.exit(1 if wrong else 0)
@@ -0,0 +1,120 @@
+import operator
+import sys
+
+from parser_1 import *
+from slicing import reads
+from stats import STATS
+from typing import Callable, Dict, List, Optional, Set
+
+# Constant propagation and branch folding.
+# main.py forks at every if, even when its condition only depends on constants (y = 10 followed by
+# if y > 5), and sends both paths to the solver. Walking the program forwards with the variables whose
+# value is the same constant on every path, the operands of those variables are replaced by their
+# values, and an if whose condition then compares 2 constants is replaced by its body or dropped.
+# Only the ifs that depend on input are left to fork.
+# A variable read before it has a value is never replaced, and an if whose body may read one is kept.
+# Only a read that fails on a side of an if that is never taken (which main.py still runs) goes away.
+
+OPERATIONS: Dict[str, Callable[[int, int], int]] = {'+': operator.add, '-': operator.sub, '*': operator.mul}
+COMPARISONS: Dict[str, Callable[[int, int], bool]] = {
+    '<': operator.lt, '>': operator.gt, '<=': operator.le, '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+
+
+class Folder:
+    '''
+    constants holds the variables known to have a constant value, assigned the ones known to have a value
+    '''
+    def __init__(self):
+        self.constants: Dict[str, int] = {}
+        self.assigned: Set[str] = set()
+
+    def copy(self) -> 'Folder':
+        folder: Folder = Folder()
+        folder.constants = dict(self.constants)
+        folder.assigned = set(self.assigned)
+        return folder
+
+    def value(self, x: Value) -> Value:
+        if isinstance(x, str):
+            return self.constants.get(x, x)
+        return x
+
+    def condition(self, condition: Comp) -> Comp:
+        return Comp(condition.op, self.value(condition.l), self.value(condition.r))
+
+    def decide(self, condition: Comp) -> Optional[bool]:
+        '''
+        The value of an already folded condition, None if it depends on input
+        '''
+        l, r = condition.l, condition.r
+        if type(l) == int and type(r) == int:
+            return COMPARISONS[condition.op](l, r)
+        if isinstance(l, str) and l == r and l in self.assigned:
+            return condition.op in ('==', '<=', '>=')
+        return None
+
+    def assignment(self, command: Assignment) -> Assignment:
+        rhs = command.rhs
+        if isinstance(rhs, Expr):
+            l, r = self.value(rhs.l), self.value(rhs.r)
+            rhs = OPERATIONS[rhs.op](l, r) if type(l) == int and type(r) == int else Expr(rhs.op, l, r)
+        elif not isinstance(rhs, Input):
+            rhs = self.value(rhs)
+        if type(rhs) == int:
+            self.constants[command.lhs] = rhs
+        else:
+            self.constants.pop(command.lhs, None)
+        self.assigned.add(command.lhs)
+        return Assignment(command.lhs, rhs)
+
+    def may_fail(self, body: List[Assignment]) -> bool:
+        '''
+        Check if the body may read a variable before it has a value
+        '''
+        assigned: Set[str] = set(self.assigned)
+        for command in body:
+            if not reads(command.rhs) <= assigned:
+                return True
+            assigned.add(command.lhs)
+        return False
+
+    def join(self, other: 'Folder') -> None:
+        '''
+        Keep what holds both here and in other - the 2 sides of an if
+        '''
+        self.constants = {name: value for name, value in self.constants.items() if other.constants.get(name) == value}
+        self.assigned &= other.assigned
+
+
+def fold_program(program: Program) -> Program:
+    '''
+    The program with the constants propagated and the ifs that don't depend on input folded
+    '''
+    folder: Folder = Folder()
+    commands: List[Command] = []
+    folded: int = 0
+    for command in program.commands:
+        if not isinstance(command, If):
+            commands.append(folder.assignment(command))
+            continue
+        condition: Comp = folder.condition(command.condition)
+        taken: Optional[bool] = None
+        if reads(command.condition) <= folder.assigned and not folder.may_fail(command.body):
+            taken = folder.decide(condition)
+        if taken is not None:
+            folded += 1
+            if taken:
+                commands.extend(folder.assignment(assignment) for assignment in command.body)
+            continue
+        folder_body: Folder = folder.copy()
+        commands.append(If(condition, [folder_body.assignment(assignment) for assignment in command.body]))
+        folder.join(folder_body)
+
+    STATS.count("folded_branches", folded)
+    return Program(commands, folder.condition(program.postCondition), program.variables, program.line)
+
+
+if __name__ == "__main__":
+    for filename in sys.argv[1:]:
+        print(filename)
+        print(fold_program(parse_file(filename)))
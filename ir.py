@@ -0,0 +1,119 @@
+from parser_1 import *
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Compact form of a Program that the path engines run on.
+# Every variable gets an integer slot, so an environment is a flat list indexed by slot instead
+# of a dict of names, operands are (kind, slot or constant) tuples and the operations are resolved
+# to codes once, when the program is compiled, instead of on every path.
+
+# Operand kinds
+SLOT = 0
+CONSTANT = 1
+INPUT = 2
+Operand = Tuple[int, int]
+
+# Assignment operations
+COPY = 0
+ADD = 1
+SUB = 2
+MUL = 3
+EXPR_OPS: Dict[str, int] = {'+': ADD, '-': SUB, '*': MUL}
+
+COMP_OPS_OPPOSITES: Dict[str, str] = {'==': '!=', '!=': '==', '<': '>=', '>': '<=', '<=': '>', '>=': '<'}
+COMP_OPS_MIRRORED: Dict[str, str] = {'<': '>', '>': '<', '<=': '>=', '>=': '<=', '==': '==', '!=': '!='}
+
+
+class Assign:
+    '''
+    slot = l, or slot = l op r when op isn't COPY
+    '''
+    __slots__ = ("slot", "op", "l", "r")
+
+    def __init__(self, slot: int, op: int, l: Operand, r: Optional[Operand] = None):
+        self.slot: int = slot
+        self.op: int = op
+        self.l: Operand = l
+        self.r: Optional[Operand] = r
+
+
+class Cond:
+    '''
+    l op r, together with the operator of its negation
+    '''
+    __slots__ = ("op", "opposite", "l", "r")
+
+    def __init__(self, op: str, l: Operand, r: Operand):
+        self.op: str = op
+        self.opposite: str = COMP_OPS_OPPOSITES[op]
+        self.l: Operand = l
+        self.r: Operand = r
+
+    def mirrored(self) -> 'Cond':
+        '''
+        The same condition with the sides swapped
+        '''
+        return Cond(COMP_OPS_MIRRORED[self.op], self.r, self.l)
+
+
+class Branch:
+    __slots__ = ("condition", "body")
+
+    def __init__(self, condition: Cond, body: Tuple[Assign, ...]):
+        self.condition: Cond = condition
+        self.body: Tuple[Assign, ...] = body
+
+
+class CompiledProgram:
+    '''
+    names[slot] is the name of the variable in slot, slots maps names back to slots
+    '''
+    __slots__ = ("commands", "post", "names", "slots")
+
+    def __init__(self, commands: Tuple[Union[Assign, Branch], ...], post: Cond, names: Tuple[str, ...]):
+        self.commands: Tuple[Union[Assign, Branch], ...] = commands
+        self.post: Cond = post
+        self.names: Tuple[str, ...] = names
+        self.slots: Dict[str, int] = {name: slot for slot, name in enumerate(names)}
+
+    def environment(self) -> List[Optional[Any]]:
+        '''
+        An environment where no variable has a value yet
+        '''
+        return [None] * len(self.names)
+
+
+def compile_program(program: Program) -> CompiledProgram:
+    slots: Dict[str, int] = {}
+
+    def slot(name: str) -> int:
+        if name not in slots:
+            slots[name] = len(slots)
+        return slots[name]
+
+    def operand(x: Value) -> Operand:
+        if isinstance(x, str):
+            return SLOT, slot(x)
+        if isinstance(x, Input):
+            return INPUT, 0
+        return CONSTANT, x
+
+    def assignment(command: Assignment) -> Assign:
+        rhs = command.rhs
+        if isinstance(rhs, Expr):
+            if rhs.op not in EXPR_OPS:
+                raise RuntimeError("Operator " + rhs.op + " is not supported")
+            return Assign(slot(command.lhs), EXPR_OPS[rhs.op], operand(rhs.l), operand(rhs.r))
+        return Assign(slot(command.lhs), COPY, operand(rhs))
+
+    def condition(comparison: Comp) -> Cond:
+        return Cond(comparison.op, operand(comparison.l), operand(comparison.r))
+
+    commands: List[Union[Assign, Branch]] = []
+    for command in program.commands:
+        if isinstance(command, If):
+            commands.append(Branch(condition(command.condition),
+                                   tuple(assignment(body_command) for body_command in command.body)))
+        else:
+            commands.append(assignment(command))
+    post: Cond = condition(program.postCondition)
+    return CompiledProgram(tuple(commands), post, tuple(slots))
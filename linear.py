@@ -0,0 +1,219 @@
+from math import gcd
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# Decision procedure for small systems of linear constraints over the integers.
+# The leaf queries of main.py are tiny, and for them building the z3 terms costs more than solving.
+# Equations with a coefficient of 1 are substituted away, the inequalities go through Fourier-Motzkin
+# elimination with the constants rounded to the integers, and disequations are split into < and >
+# when the model found violates them. A system of inequalities without a rational solution has no
+# integer one either, so "unsatisfiable" is always exact, and every model is checked against the
+# original constraints before it's returned. Whatever falls outside of that (too many variables,
+# inequalities or splits, or no integer between the bounds of a variable) is left undecided for z3.
+
+Linear = Tuple[Dict[Hashable, int], int]
+# sum of coefficient * variable + constant op 0, op is '<=', '==' or '!='
+LinearConstraint = Tuple[str, Dict[Hashable, int], int]
+Model = Dict[Hashable, int]
+
+MAX_VARIABLES = 12
+MAX_INEQUALITIES = 300
+MAX_DISEQUATIONS = 6
+
+
+class Undecided(Exception):
+    pass
+
+
+def gcd_of(coefficients: Dict[Hashable, int]) -> int:
+    result: int = 0
+    for coefficient in coefficients.values():
+        result = gcd(result, coefficient)
+    return result
+
+
+def value(linear: Linear, model: Model) -> int:
+    coefficients, constant = linear
+    return constant + sum(coefficient * model.get(variable, 0) for variable, coefficient in coefficients.items())
+
+
+def substitute(linear: Linear, variable: Hashable, replacement: Linear) -> Linear:
+    '''
+    Replace variable by the linear expression replacement
+    '''
+    coefficients, constant = linear
+    factor: Optional[int] = coefficients.get(variable)
+    if factor is None:
+        return linear
+    result: Dict[Hashable, int] = {other: coefficient for other, coefficient in coefficients.items() if other != variable}
+    for other, coefficient in replacement[0].items():
+        result[other] = result.get(other, 0) + factor * coefficient
+    return {other: coefficient for other, coefficient in result.items() if coefficient}, \
+        constant + factor * replacement[1]
+
+
+def tighten(linear: Linear) -> Linear:
+    '''
+    Divide linear <= 0 by the gcd of its coefficients, rounding the constant up - the same integer solutions
+    '''
+    coefficients, constant = linear
+    divisor: int = gcd_of(coefficients)
+    if divisor <= 1:
+        return linear
+    return {variable: coefficient // divisor for variable, coefficient in coefficients.items()}, \
+        -(-constant // divisor)
+
+
+def add_inequality(system: Dict[frozenset, Linear], linear: Linear) -> bool:
+    '''
+    Add linear <= 0 to system, keeping only the strongest of the inequalities with the same coefficients.\n
+    Returns False if it can't hold
+    '''
+    coefficients, constant = tighten(({variable: coefficient for variable, coefficient in linear[0].items() if coefficient},
+                                      linear[1]))
+    if not coefficients:
+        return constant <= 0
+    key = frozenset(coefficients.items())
+    known: Optional[Linear] = system.get(key)
+    if known is None or known[1] < constant:
+        system[key] = (coefficients, constant)
+    return True
+
+
+def fourier_motzkin(inequalities: List[Linear]) -> Optional[Model]:
+    '''
+    Find integer values for which all the inequalities (linear <= 0) hold, None if there are none
+    '''
+    system: Dict[frozenset, Linear] = {}
+    for inequality in inequalities:
+        if not add_inequality(system, inequality):
+            return None
+
+    eliminated: List[Tuple[Hashable, List[Linear]]] = []
+    while system:
+        occurrences: Dict[Hashable, List[int]] = {}
+        for coefficients, _ in system.values():
+            for variable, coefficient in coefficients.items():
+                occurrences.setdefault(variable, [0, 0])[coefficient < 0] += 1
+        # The variable that produces the fewest new inequalities
+        variable: Hashable = min(occurrences, key=lambda v: occurrences[v][0] * occurrences[v][1]
+                                 - occurrences[v][0] - occurrences[v][1])
+        bounding: List[Linear] = [linear for linear in system.values() if variable in linear[0]]
+        eliminated.append((variable, bounding))
+
+        rest: Dict[frozenset, Linear] = {key: linear for key, linear in system.items() if variable not in linear[0]}
+        uppers: List[Linear] = [linear for linear in bounding if linear[0][variable] > 0]
+        lowers: List[Linear] = [linear for linear in bounding if linear[0][variable] < 0]
+        for upper in uppers:
+            for lower in lowers:
+                a, b = upper[0][variable], -lower[0][variable]
+                combined: Dict[Hashable, int] = {}
+                for other, coefficient in upper[0].items():
+                    combined[other] = b * coefficient
+                for other, coefficient in lower[0].items():
+                    combined[other] = combined.get(other, 0) + a * coefficient
+                combined = {other: coefficient for other, coefficient in combined.items() if coefficient}
+                if not add_inequality(rest, (combined, b * upper[1] + a * lower[1])):
+                    return None
+        if len(rest) > MAX_INEQUALITIES:
+            raise Undecided()
+        system = rest
+
+    # Every variable is bounded only by the ones eliminated after it, which already have their values
+    model: Model = {}
+    for variable, bounding in reversed(eliminated):
+        lower_bound, upper_bound = None, None
+        for coefficients, constant in bounding:
+            coefficient: int = coefficients[variable]
+            rest_value: int = value((coefficients, constant), model) - coefficient * model.get(variable, 0)
+            if coefficient > 0:
+                bound: int = -rest_value // coefficient
+                upper_bound = bound if upper_bound is None else min(upper_bound, bound)
+            else:
+                bound = -(-rest_value // -coefficient)
+                lower_bound = bound if lower_bound is None else max(lower_bound, bound)
+        if lower_bound is not None and upper_bound is not None and lower_bound > upper_bound:
+            # A rational solution without an integer one
+            raise Undecided()
+        if lower_bound is not None and lower_bound > 0:
+            model[variable] = lower_bound
+        elif upper_bound is not None and upper_bound < 0:
+            model[variable] = upper_bound
+        else:
+            model[variable] = 0
+    return model
+
+
+def satisfy(inequalities: List[Linear], disequations: List[Linear]) -> Optional[Model]:
+    model: Optional[Model] = fourier_motzkin(inequalities)
+    if model is None:
+        return None
+    for i, disequation in enumerate(disequations):
+        if value(disequation, model) == 0:
+            # Split disequation != 0 into disequation < 0 and disequation > 0
+            coefficients, constant = disequation
+            others: List[Linear] = disequations[:i] + disequations[i + 1:]
+            negative: Linear = (coefficients, constant + 1)
+            positive: Linear = ({variable: -coefficient for variable, coefficient in coefficients.items()},
+                                1 - constant)
+            model = satisfy(inequalities + [negative], others)
+            if model is None:
+                model = satisfy(inequalities + [positive], others)
+            return model
+    return model
+
+
+def solve(constraints: List[LinearConstraint]) -> Optional[Tuple[bool, Optional[Model]]]:
+    '''
+    Decide if the constraints have an integer solution.\n
+    Returns (True, model), (False, None), or None when the system is left for z3
+    '''
+    variables = {variable for _, coefficients, _ in constraints for variable in coefficients}
+    if len(variables) > MAX_VARIABLES:
+        return None
+
+    equations: List[Linear] = [(coefficients, constant) for op, coefficients, constant in constraints if op == '==']
+    inequalities: List[Linear] = [(coefficients, constant) for op, coefficients, constant in constraints if op == '<=']
+    disequations: List[Linear] = [(coefficients, constant) for op, coefficients, constant in constraints if op == '!=']
+    if len(disequations) > MAX_DISEQUATIONS:
+        return None
+
+    substitutions: List[Tuple[Hashable, Linear]] = []
+    while equations:
+        coefficients, constant = equations.pop()
+        coefficients = {variable: coefficient for variable, coefficient in coefficients.items() if coefficient}
+        if not coefficients:
+            if constant != 0:
+                return False, None
+            continue
+        if constant % gcd_of(coefficients):
+            return False, None
+        unit: Optional[Hashable] = next((variable for variable, coefficient in coefficients.items()
+                                         if abs(coefficient) == 1), None)
+        if unit is None:
+            inequalities += [(coefficients, constant),
+                             ({variable: -coefficient for variable, coefficient in coefficients.items()}, -constant)]
+            continue
+        # unit * x + rest == 0 means x == -unit * rest
+        sign: int = coefficients[unit]
+        replacement: Linear = ({variable: -sign * coefficient for variable, coefficient in coefficients.items()
+                                if variable != unit}, -sign * constant)
+        substitutions.append((unit, replacement))
+        equations = [substitute(linear, unit, replacement) for linear in equations]
+        inequalities = [substitute(linear, unit, replacement) for linear in inequalities]
+        disequations = [substitute(linear, unit, replacement) for linear in disequations]
+
+    try:
+        model: Optional[Model] = satisfy(inequalities, disequations)
+    except Undecided:
+        return None
+    if model is None:
+        return False, None
+
+    for variable in variables:
+        model.setdefault(variable, 0)
+    for variable, replacement in reversed(substitutions):
+        model[variable] = value(replacement, model)
+    holds = {'<=': lambda x: x <= 0, '==': lambda x: x == 0, '!=': lambda x: x != 0}
+    if not all(holds[op](value((coefficients, constant), model)) for op, coefficients, constant in constraints):
+        return None
+    return True, model
@@ -1,35 +1,63 @@
+import argparse
+import functools
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 from parser_1 import *
-from typing import Optional, Dict, Tuple, List
-from z3 import Int, Solver, sat
-
-COMP_OPS_OPPOSITES = {
-    '==': '!=',
-    '!=': '==',
-    '<': '>=',
-    '>': '<=',
-    '<=': '>',
-    '>=': '<'
-}
+from ir import *
+import linear
+from worklist import STRATEGIES, explore
+from stats import STATS, Stats, collect
+from typing import Optional, Dict, Tuple, List, FrozenSet, Iterable, Any, Callable
+from weakref import WeakValueDictionary
+from z3 import Int, Solver, sat, unsat, unknown, ArithRef, BoolRef, ModelRef, CheckSatResult
 
-Comparisons = List[Tuple[str, 'Polynomial', 'Polynomial']]
+Comparisons = List[Union[Tuple[str, 'Polynomial', 'Polynomial'], 'Comparison']]
 Variables = Dict[str, 'Variable']
+# Values of the variables of a CompiledProgram, by slot
+Values = List[Optional['Polynomial']]
 
 # Assume each variable gets assigned input() only once
 # Assume variables don't get multiplied by each other
 # _ after variable name means it's the value received from input()
 # The code is quite inefficient, it's exponential in the number of if statements in the program,
-# but can be improved by branch pruning
+# branch pruning (PathSolver's prune_every) drops infeasible branches at the fork instead of at the leaves.
+# The paths are explored from a worklist (worklist.py) in the order of a strategy, not recursively
 
 class InputVariable:
+    '''
+    The value received from one input() call.\n
+    Input variables are interned - there is exactly one object per name, so they compare and hash by identity
+    '''
+    interned: Dict[str, 'InputVariable'] = {}
+
+    def __new__(cls, name: str) -> 'InputVariable':
+        variable: Optional[InputVariable] = cls.interned.get(name)
+        if variable is None:
+            variable = super().__new__(cls)
+            variable.name = name
+            cls.interned[name] = variable
+        return variable
+
     def __init__(self, name: str):
         self.name: str = name
 
+    def __reduce__(self):
+        return InputVariable, (self.name,)
+
     def __str__(self) -> str:
         return self.name
 
 class PolynomialTerm:
     '''
-    Represents a non-constant term in a polynomial.\n
+    Represents a non-constant term in a polynomial, for printing it (see Polynomial.terms).\n
     e.g. 2*x in the polynomial 3*y + 2*x + 1
     '''
     def __init__(self, variable: InputVariable, coefficient: int, power: int):
@@ -49,229 +77,1220 @@ class PolynomialTerm:
             string += "^" + str(self.power)
         return string
 
-    def __neg__(self) -> 'PolynomialTerm':
-        return PolynomialTerm(self.variable, -self.coefficient, self.power)
-    
-    def copy(self) -> 'PolynomialTerm':
-        return PolynomialTerm(self.variable, self.coefficient, self.power)
-    
-    def is_zero(self) -> None:
-        return self.coefficient == 0
+Monomial = Tuple[InputVariable, int]
 
 class Polynomial:
-    def __init__(self, terms: List[PolynomialTerm], constant: int):
-        self.terms: List[PolynomialTerm] = terms
-        self.constant: int = constant
+    '''
+    Immutable polynomial, stored as a map (input variable, power) -> coefficient and a constant.\n
+    Terms with coefficient 0 are never stored, so equal polynomials have equal maps.\n
+    Polynomials are hash-consed like the input variables - constructing a polynomial equal to one that
+    is still alive returns that one, so equal polynomials are the same object and compare and hash
+    by identity in O(1)
+    '''
+    interned: 'WeakValueDictionary[Tuple[FrozenSet[Tuple[Monomial, int]], int], Polynomial]' = WeakValueDictionary()
+    coefficients: Dict[Monomial, int]
+    constant: int
+
+    def __new__(cls, coefficients: Dict[Monomial, int], constant: int) -> 'Polynomial':
+        key: Tuple[FrozenSet[Tuple[Monomial, int]], int] = (frozenset(coefficients.items()), constant)
+        polynomial: Optional[Polynomial] = cls.interned.get(key)
+        if polynomial is None:
+            polynomial = super().__new__(cls)
+            polynomial.coefficients = coefficients
+            polynomial.constant = constant
+            cls.interned[key] = polynomial
+        return polynomial
+
+    def __reduce__(self):
+        # Interned again in the process that unpickles it
+        return Polynomial, (self.coefficients, self.constant)
 
     @staticmethod
     def from_constant(constant: int) -> 'Polynomial':
-        return Polynomial([], constant)
+        return Polynomial({}, constant)
     
     @staticmethod
     def from_one_var(name: str) -> 'Polynomial':
-        return Polynomial([PolynomialTerm(InputVariable(name), 1, 1)], 0)
+        return Polynomial({(InputVariable(name), 1): 1}, 0)
     
+    @property
+    def terms(self) -> List[PolynomialTerm]:
+        return [PolynomialTerm(variable, coefficient, power)
+                for (variable, power), coefficient in self.coefficients.items()]
+
     def is_constant(self) -> bool:
-        return self.terms == []
+        return not self.coefficients
 
     def __str__(self) -> str:
-        if len(self.terms) == 0:
+        if len(self.coefficients) == 0:
             return str(self.constant)
         string: str = " + ".join([str(term) for term in self.terms])
         return string + " + " + str(self.constant) if self.constant != 0 else string
-    
-    def deep_copy(self) -> 'Polynomial':
-        return Polynomial([term.copy() for term in self.terms], self.constant)
+
+    def combine(self, other: 'Polynomial', factor: int) -> 'Polynomial':
+        '''
+        self + factor * other
+        '''
+        coefficients: Dict[Monomial, int] = dict(self.coefficients)
+        for monomial, coefficient in other.coefficients.items():
+            coefficient = coefficients.get(monomial, 0) + factor * coefficient
+            if coefficient == 0:
+                coefficients.pop(monomial, None)
+            else:
+                coefficients[monomial] = coefficient
+        return Polynomial(coefficients, self.constant + factor * other.constant)
     
     def __add__(self, other: 'Polynomial') -> 'Polynomial':
-        for other_term in other.terms:
-            for self_term in self.terms:
-                if self_term.variable == other_term.variable and self_term.power == other_term.power:
-                    self_term.coefficient += other_term.coefficient
-                    break
-            else:
-                self.terms.append(other_term)
-
-        self.constant += other.constant
-        return self
+        return self.combine(other, 1)
         
     def __neg__(self) -> 'Polynomial':
-        return Polynomial([-term for term in self.terms], -self.constant)
+        return self.scale(-1)
     
     def __sub__(self, other: 'Polynomial') -> 'Polynomial':
-        return self + (-other)
+        return self.combine(other, -1)
+
+    def scale(self, factor: int) -> 'Polynomial':
+        if factor == 0:
+            return Polynomial.from_constant(0)
+        return Polynomial({monomial: factor * coefficient for monomial, coefficient in self.coefficients.items()},
+                          factor * self.constant)
     
     def __mul__(self, other: 'Polynomial') -> 'Polynomial':
         if self.is_constant():
-            ret: Polynomial = Polynomial([term.copy() for term in other.terms], self.constant * other.constant)
-            for term in ret.terms:
-                term.coefficient *= self.constant
-            return ret
+            return other.scale(self.constant)
         elif other.is_constant():
-            ret: Polynomial = Polynomial([term.copy() for term in self.terms], self.constant * other.constant)
-            for term in ret.terms:
-                term.coefficient *= other.constant
-            return ret
+            return self.scale(other.constant)
         print("Multiplication of 2 variables is not supported")
         return self
 
 
+class Comparison:
+    '''
+    lhs op rhs, hash-consed like the polynomials - build comparisons with compare, so the same comparison
+    on sibling paths is the same object.\n
+    Unpacks like the (op, lhs, rhs) tuples the engines also accept, canonical is its canonical_comparison
+    once computed
+    '''
+    __slots__ = ("op", "lhs", "rhs", "canonical", "__weakref__")
+    # Only weakly - a comparison is dropped together with the last path that has it
+    interned: 'WeakValueDictionary[Tuple[str, Polynomial, Polynomial], Comparison]' = WeakValueDictionary()
+
+    def __init__(self, op: str, lhs: Polynomial, rhs: Polynomial):
+        self.op: str = op
+        self.lhs: Polynomial = lhs
+        self.rhs: Polynomial = rhs
+        self.canonical: Optional[Tuple[str, Polynomial]] = None
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter((self.op, self.lhs, self.rhs))
+
+    def __reduce__(self):
+        # Interned again in the process that unpickles it
+        return compare, (self.op, self.lhs, self.rhs)
+
+
+def compare(op: str, lhs: Polynomial, rhs: Polynomial) -> Comparison:
+    '''
+    The interned comparison lhs op rhs
+    '''
+    key: Tuple[str, Polynomial, Polynomial] = (op, lhs, rhs)
+    comparison: Optional[Comparison] = Comparison.interned.get(key)
+    if comparison is None:
+        comparison = Comparison.interned[key] = Comparison(op, lhs, rhs)
+    return comparison
+
+
 class Variable:
+    '''
+    Starting value of a program variable for is_assert_true and leaf_paths
+    '''
     def __init__(self, name: str, polynomial: Optional[Polynomial] = None):
         self.name: str = name
         self.value: Optional[Polynomial] = polynomial
-        self.just_int_holder: bool = False
-    
-    def deep_copy(self) -> 'Variable':
-        copy: Variable = Variable(self.name)
-        if self.value is not None:
-            copy.value = self.value.deep_copy()
-        copy.just_int_holder = self.just_int_holder
-        return copy
-    
+
     def __str__(self) -> str:
         return self.name + " = " + str(self.value)
 
 
-def to_Variable(x: Value, variables: Variables) -> Union[Variable, Value]:
-    if isinstance(x, str):
-        x: Variable = variables[x].deep_copy()
-    if isinstance(x, int):
-        x: Variable = Variable("Int"+str(x), Polynomial.from_constant(x))
-        x.just_int_holder = True
-    return x
+class PathCondition:
+    '''
+    Persistent list of the comparisons along a path, newest last.\n
+    Both sides of a fork extend the same shared prefix instead of copying it
+    '''
+    def __init__(self, comparison: Optional[Tuple[str, 'Polynomial', 'Polynomial']] = None,
+                 parent: Optional['PathCondition'] = None):
+        self.comparison: Optional[Tuple[str, Polynomial, Polynomial]] = comparison
+        self.parent: Optional[PathCondition] = parent
+        self.length: int = 0 if parent is None else parent.length + 1
+
+    @staticmethod
+    def from_list(comparisons: Comparisons) -> 'PathCondition':
+        path: PathCondition = PathCondition()
+        for comparison in comparisons:
+            path = path.extend(comparison)
+        return path
+
+    def extend(self, comparison: Tuple[str, 'Polynomial', 'Polynomial']) -> 'PathCondition':
+        return PathCondition(comparison, self)
+
+    def __iter__(self) -> Iterator[Tuple[str, 'Polynomial', 'Polynomial']]:
+        comparisons: Comparisons = []
+        path: PathCondition = self
+        while path.parent is not None:
+            comparisons.append(path.comparison)
+            path = path.parent
+        return reversed(comparisons)
 
+    def __len__(self) -> int:
+        return self.length
 
-def branching(condition: Comp, variables: Variables, 
-              comparisons: Comparisons) \
-                -> Tuple[Comparisons, Comparisons, 
-                         Variables, Variables]:
+
+def operand_value(operand: Operand, values: Values, names: Tuple[str, ...]) -> Polynomial:
+    kind, x = operand
+    if kind == SLOT:
+        value: Optional[Polynomial] = values[x]
+        if value is None:
+            raise KeyError(names[x])
+        return value
+    if kind == CONSTANT:
+        return Polynomial.from_constant(x)
+    raise RuntimeError("input() is only supported as the whole right side of an assignment")
+
+
+@STATS.timed("branching")
+def branching(condition: Cond, values: Values, names: Tuple[str, ...],
+              comparisons: PathCondition) -> Tuple[PathCondition, PathCondition]:
     '''
-    Fork the current state of the program into 2 states - one where the condition is true and one where it's false
+    Fork the path condition into 2 - one where the condition is true and one where it's false
     '''
+    STATS.count("forks")
 
-    lhs: Variable = to_Variable(condition.l, variables)
-    rhs: Variable = to_Variable(condition.r, variables)
+    lhs: Polynomial = operand_value(condition.l, values, names)
+    rhs: Polynomial = operand_value(condition.r, values, names)
+    return comparisons.extend(compare(condition.op, lhs, rhs)), comparisons.extend(compare(condition.opposite, lhs, rhs))
 
-    comparisons_t = comparisons
-    comparisons_f = [(op, opd1, opd2) for (op, opd1, opd2) in comparisons]
-    comparisons_t.append((condition.op, lhs.value, rhs.value))
-    comparisons_f.append((COMP_OPS_OPPOSITES[condition.op], lhs.value, rhs.value))
 
-    new_vars_if: Variables = variables
-    new_vars_nif: Variables = {k: v.deep_copy() for k, v in variables.items()}
+# A state of the exploration - the index of the next command, the values and the path condition
+PathState = Tuple[int, Values, PathCondition]
 
-    return comparisons_t, comparisons_f, new_vars_if, new_vars_nif
 
+def if_command(program: CompiledProgram, commandsIndex: int, values: Values,
+               comparisons: PathCondition) -> List[PathState]:
+    '''
+    The states of both sides of the if at commandsIndex
+    '''
+    if_com: Branch = program.commands[commandsIndex]
+    comparisons_if, comparisons_nif = branching(if_com.condition, values, program.names, comparisons)
 
-def if_command(program: Program, commandsIndex: int, variables: Variables,
-               comparisons: Comparisons) -> bool:
-    if_com: Command = program.commands[commandsIndex]
+    # If the if is successful then execute the if body on a copy,
+    # the other branch continues with values - nothing else uses them afterwards
+    values_if: Values = values[:]
+    for assignment_command in if_com.body:
+        assignment(assignment_command, values_if, program.names)
+    return [(commandsIndex + 1, values_if, comparisons_if), (commandsIndex + 1, values, comparisons_nif)]
 
-    comparisons_if, comparisons_nif, \
-        new_vars_if, new_vars_nif = branching(if_com.condition, variables, comparisons)
 
-    # If the if is successful then execute the if body 
-    for assignment_command in if_com.body:
-        assignment(assignment_command, new_vars_if)
-
-    return is_assert_true(program, commandsIndex + 1, new_vars_if, comparisons_if) \
-        and is_assert_true(program, commandsIndex + 1, new_vars_nif, comparisons_nif)
-
-
-def assignment(command: Assignment, variables: Variables) -> None:
-    rhs = command.rhs
-    if isinstance(rhs, Expr):
-        rhs_l = to_Variable(rhs.l, variables)
-        rhs_r = to_Variable(rhs.r, variables)
-        if rhs.op == '+':
-            rhs_l.value = rhs_l.value + rhs_r.value
-        elif rhs.op == '-':
-            rhs_l.value = rhs_l.value - rhs_r.value
-        elif rhs.op == '*':
-            rhs_l.value = rhs_l.value * rhs_r.value
+@STATS.timed("assignment")
+def assignment(command: Assign, values: Values, names: Tuple[str, ...]) -> None:
+    op: int = command.op
+    if op == COPY:
+        if command.l[0] == INPUT:
+            values[command.slot] = Polynomial.from_one_var(names[command.slot] + "_")
         else:
-            print("Operator " + rhs.op + " is not supported")
-        rhs = rhs_l
-    elif isinstance(rhs, Input):
-        rhs: Variable = Variable(command.lhs, Polynomial.from_one_var(command.lhs + "_"))
-    else:
-        rhs = to_Variable(rhs, variables)
+            values[command.slot] = operand_value(command.l, values, names)
+        return
 
-    rhs.name = command.lhs
-    rhs.just_int_holder = False
-    variables[command.lhs] = rhs
+    lhs: Polynomial = operand_value(command.l, values, names)
+    rhs: Polynomial = operand_value(command.r, values, names)
+    if op == ADD:
+        values[command.slot] = lhs + rhs
+    elif op == SUB:
+        values[command.slot] = lhs - rhs
+    else:
+        values[command.slot] = lhs * rhs
 
 
 def parse_rhs(rhs: Polynomial, variables: Variables):
     value = rhs.constant
-    for part in rhs.terms:
-        value += part.coefficient * variables[part.variable.name]
+    for (variable, _), coefficient in rhs.coefficients.items():
+        value += coefficient * variables[variable.name]
     return value
 
-def satisfiable(input_variables: Set[str],
-                comparisons: Comparisons) -> bool:
+
+def to_z3(comparison: Tuple[str, Polynomial, Polynomial], variables: Dict[str, ArithRef]) -> BoolRef:
+    op, opd1, opd2 = comparison
+    lhs, rhs = parse_rhs(opd1, variables), parse_rhs(opd2, variables)
+    return lhs < rhs if op == '<' else \
+           lhs > rhs if op == '>' else \
+           lhs <= rhs if op == '<=' else \
+           lhs >= rhs if op == '>=' else \
+           lhs == rhs if op == '==' else \
+           lhs != rhs
+
+
+class Unknown(Exception):
     '''
-    Check if the system of equations and inequalities in comparisons has any solution using z3\n
-    input_variables is a set of all the variables that appear in the system
+    z3 couldn't decide a query within its timeout, or the verification ran out of its budget or was cancelled
     '''
-    variables = {}
-    for var in input_variables:
-        variables[var] = Int(var)
 
-    solver = Solver()
-        
+
+class Budget:
+    '''
+    Time limits of a verification - timeout seconds for each z3 query and seconds for all of it.\n
+    cancelled is polled together with the clock, once it returns True the verification stops.\n
+    Checks raise Unknown when the time is up, only a running z3 query isn't interrupted before its own timeout
+    '''
+    def __init__(self, timeout: Optional[float] = None, seconds: Optional[float] = None,
+                 cancelled: Optional[Callable[[], bool]] = None):
+        self.timeout: Optional[float] = timeout
+        self.seconds: Optional[float] = seconds
+        self.cancelled: Optional[Callable[[], bool]] = cancelled
+        self.start()
+
+    def start(self) -> None:
+        '''
+        Start counting the seconds from now
+        '''
+        self.deadline: Optional[float] = None if self.seconds is None else time.monotonic() + self.seconds
+
+    def check(self) -> None:
+        if self.cancelled is not None and self.cancelled():
+            raise Unknown("cancelled")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise Unknown("time budget exhausted")
+
+    def query_timeout(self) -> Optional[float]:
+        '''
+        Seconds the next z3 query may take, None if it has no limit
+        '''
+        self.check()
+        if self.deadline is None:
+            return self.timeout
+        remaining: float = self.deadline - time.monotonic()
+        return remaining if self.timeout is None else min(self.timeout, remaining)
+
+    def limit(self, solver: Solver) -> None:
+        '''
+        Set the timeout of solver for its next check
+        '''
+        timeout: Optional[float] = self.query_timeout()
+        if timeout is not None:
+            solver.set("timeout", max(1, int(timeout * 1000)))
+
+
+def independent_components(comparisons: Iterable[Comparison]) -> List[Comparisons]:
+    '''
+    Split a constraint set into independent components - groups of comparisons over disjoint sets of
+    input variables (constraint independence, as in KLEE). The set has a solution iff every component
+    has one, and the union of their models is a model of the set.\n
+    A comparison without variables is a component of its own
+    '''
+    comparisons = list(comparisons)
+    parent: Dict[InputVariable, InputVariable] = {}
+
+    def find(variable: InputVariable) -> InputVariable:
+        root: InputVariable = variable
+        while parent[root] is not root:
+            root = parent[root]
+        while parent[variable] is not root:
+            parent[variable], variable = root, parent[variable]
+        return root
+
+    for _, lhs, rhs in comparisons:
+        variables: List[InputVariable] = [variable for variable, _ in chain(lhs.coefficients, rhs.coefficients)]
+        for variable in variables:
+            parent.setdefault(variable, variable)
+        for variable in variables[1:]:
+            parent[find(variable)] = find(variables[0])
+
+    components: Dict[Any, Comparisons] = {}
     for comparison in comparisons:
-        op, opd1, opd2 = comparison
-        solver.add(parse_rhs(opd1, variables) < parse_rhs(opd2, variables) if op == '<' else
-                   parse_rhs(opd1, variables) > parse_rhs(opd2, variables) if op == '>' else
-                   parse_rhs(opd1, variables) <= parse_rhs(opd2, variables) if op == '<=' else
-                   parse_rhs(opd1, variables) >= parse_rhs(opd2, variables) if op == '>=' else
-                   parse_rhs(opd1, variables) == parse_rhs(opd2, variables) if op == '==' else
-                   parse_rhs(opd1, variables) != parse_rhs(opd2, variables))
-    
-    # print(solver)
-    if solver.check() == sat:
-        # print("Counterexample: ")
-        # for var in solver.model():
-        #     if var.name()[-1] == "_":
-        #         print(var.name()[:-1], "=", solver.model()[var])
-        return True
-    else:
-        return False
+        _, lhs, rhs = comparison
+        first: Optional[Monomial] = next(chain(lhs.coefficients, rhs.coefficients), None)
+        components.setdefault(comparison if first is None else find(first[0]), []).append(comparison)
+    return list(components.values())
+
+
+def input_values(model: ModelRef) -> Dict[str, int]:
+    '''
+    Values of the inputs in a z3 model, by the name of the program variable that received them
+    '''
+    return {decl.name()[:-1]: model[decl].as_long() for decl in model.decls() if decl.name().endswith("_")}
+
+
+CanonicalComparison = Tuple[str, Polynomial]
+
+CANONICAL_OPS = {
+    # op: (operation in the canonical form, lhs - rhs is negated, constant added)
+    '<': ('<=', False, 1),
+    '<=': ('<=', False, 0),
+    '>': ('<=', True, 1),
+    '>=': ('<=', True, 0),
+    '==': ('==', False, 0),
+    '!=': ('!=', False, 0)
+}
+
+
+def canonical_comparison(comparison: Tuple[str, Polynomial, Polynomial]) -> CanonicalComparison:
+    '''
+    Rewrite lhs op rhs as p <= 0, p == 0 or p != 0 (the variables are integers, so p < 0 is p + 1 <= 0).\n
+    For == and != the sign of p is chosen so the term of the alphabetically first variable is positive.\n
+    The rewrite of a Comparison is kept on it, so it lives exactly as long as the comparison
+    '''
+    if isinstance(comparison, Comparison):
+        if comparison.canonical is None:
+            comparison.canonical = rewrite_comparison(*comparison)
+        return comparison.canonical
+    return rewrite_comparison(*comparison)
+
+
+def rewrite_comparison(op: str, lhs: Polynomial, rhs: Polynomial) -> CanonicalComparison:
+    canonical_op, negate, constant = CANONICAL_OPS[op]
+    polynomial: Polynomial = rhs - lhs if negate else lhs - rhs
+    if constant:
+        polynomial = polynomial + Polynomial.from_constant(constant)
+    if canonical_op != '<=':
+        if polynomial.coefficients:
+            first: Monomial = min(polynomial.coefficients, key=lambda monomial: (monomial[0].name, monomial[1]))
+            sign: int = polynomial.coefficients[first]
+        else:
+            sign = polynomial.constant
+        if sign < 0:
+            polynomial = -polynomial
+    return canonical_op, polynomial
+
+
+def canonical_form(comparisons: Iterable[Tuple[str, Polynomial, Polynomial]]) -> FrozenSet[CanonicalComparison]:
+    '''
+    Canonical form of a constraint set - the set of its canonical comparisons, without
+    equations that only define a variable occurring nowhere else (like the final values of variables),
+    because those can always be satisfied
+    '''
+    canonical: List[CanonicalComparison] = [canonical_comparison(comparison) for comparison in comparisons]
+    occurrences: Dict[InputVariable, int] = {}
+    for _, polynomial in canonical:
+        for variable, _ in polynomial.coefficients:
+            occurrences[variable] = occurrences.get(variable, 0) + 1
+
+    def defines_fresh_variable(op: str, polynomial: Polynomial) -> bool:
+        return op == '==' and any(power == 1 and abs(coefficient) == 1 and occurrences[variable] == 1
+                                  for (variable, power), coefficient in polynomial.coefficients.items())
+
+    return frozenset(comparison for comparison in canonical if not defines_fresh_variable(*comparison))
+
+
+SatResult = Tuple[bool, Optional[Dict[str, int]]]
+
+
+def linear_result(comparisons: Iterable[Comparison]) -> Optional[SatResult]:
+    '''
+    Decide comparisons with linear.solve, None if it can't
+    '''
+    constraints: List[linear.LinearConstraint] = []
+    for comparison in comparisons:
+        op, polynomial = canonical_comparison(comparison)
+        if any(power != 1 for _, power in polynomial.coefficients):
+            return None
+        constraints.append((op, {variable: coefficient for (variable, _), coefficient
+                                 in polynomial.coefficients.items()}, polynomial.constant))
+    STATS.count("linear_checks")
+    result = linear.solve(constraints)
+    if result is None:
+        return None
+    satisfiable, model = result
+    if not satisfiable:
+        return False, None
+    return True, {variable.name[:-1]: value for variable, value in model.items() if variable.name.endswith("_")}
+
+
+class SatCache:
+    '''
+    Size-bounded LRU cache of satisfiability results keyed by the canonical form of the constraint set.\n
+    Only whether the set is satisfiable is kept, not a model - the canonical form leaves out the equations
+    that define fresh variables, so sets with different models (e.g. different final values) share a key.\n
+    Lookups are also counted in STATS (sat_cache_hits, sat_cache_misses), so the hit rate of the
+    cache of every worker process reaches --stats
+    '''
+    def __init__(self, max_size: int = 100000):
+        self.results: OrderedDict[FrozenSet[CanonicalComparison], bool] = OrderedDict()
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: FrozenSet[CanonicalComparison]) -> Optional[bool]:
+        result: Optional[bool] = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            STATS.count("sat_cache_misses")
+            return None
+        self.hits += 1
+        STATS.count("sat_cache_hits")
+        self.results.move_to_end(key)
+        return result
+
+    def put(self, key: FrozenSet[CanonicalComparison], result: bool) -> None:
+        self.results[key] = result
+        self.results.move_to_end(key)
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_rate():.1%}), {len(self.results)} entries"
+
+
+class Z3Variables(dict):
+    '''
+    z3 integer constants by name, created the first time they are looked up
+    '''
+    def __missing__(self, name: str) -> ArithRef:
+        self[name] = Int(name)
+        return self[name]
+
+
+class PathSolver:
+    '''
+    One z3 solver shared by a whole exploration of the path tree.\n
+    Every if fork opens a scope that holds only its own branch condition, so a leaf
+    only adds its own constraints on top of what its prefix has already asserted.\n
+    Checks are first tried with linear.solve (unless linear is False), the constraints are only
+    translated to z3 and asserted in the z3 solver once a check needs it.\n
+    prune_every sets how eagerly forks are checked for feasibility - 0 never checks
+    (only the leaves are solved), 1 checks every fork, n checks every n-th fork level.\n
+    counterexample holds the inputs of the last satisfiable leaf.\n
+    A comparison that is already asserted (the same tuple, see compare) isn't asserted again.\n
+    With a cache, checks whose constraint set is already in it never reach z3 - except satisfiable leaves,
+    which are solved again for their counterexample.\n
+    With a budget, every check raises Unknown once it's used up, and so does a leaf z3 can't decide in time
+    '''
+    def __init__(self, prune_every: int = 0, cache: Optional[SatCache] = None, linear: bool = True,
+                 budget: Optional[Budget] = None):
+        self.solver: Solver = Solver()
+        self.variables: Z3Variables = Z3Variables()
+        self.prune_every: int = prune_every
+        self.depth: int = 0
+        self.counterexample: Optional[Dict[str, int]] = None
+        self.cache: Optional[SatCache] = cache
+        self.linear: bool = linear
+        self.budget: Optional[Budget] = budget
+        # All the asserted constraints, and where each open scope starts in them
+        self.constraints: Comparisons = []
+        self.asserted: Set[Comparison] = set()
+        self.scopes: List[int] = []
+        # Every comparison asserted so far, so the ones sibling paths build again are still interned
+        # with their canonical form - until the exploration (and this solver) is done
+        self.seen: Set[Comparison] = set()
+        # How many of the scopes and of the constraints the z3 solver has
+        self.z3_scopes: int = 0
+        self.z3_constraints: int = 0
+
+    def add(self, comparison: Tuple[str, Polynomial, Polynomial]) -> None:
+        if comparison in self.asserted:
+            return
+        self.asserted.add(comparison)
+        self.seen.add(comparison)
+        self.constraints.append(comparison)
+
+    def enter(self) -> None:
+        self.scopes.append(len(self.constraints))
+
+    def leave(self) -> None:
+        start: int = self.scopes.pop()
+        self.asserted.difference_update(self.constraints[start:])
+        del self.constraints[start:]
+        if self.z3_scopes > len(self.scopes):
+            self.solver.pop()
+            self.z3_scopes -= 1
+        self.z3_constraints = min(self.z3_constraints, start)
+
+    def push(self, comparison: Tuple[str, Polynomial, Polynomial]) -> None:
+        self.enter()
+        self.depth += 1
+        self.add(comparison)
+
+    def pop(self) -> None:
+        self.leave()
+        self.depth -= 1
+
+    def sync(self) -> None:
+        '''
+        Assert the constraints the z3 solver doesn't have yet, each in its own scope
+        '''
+        for start in self.scopes[self.z3_scopes:] + [len(self.constraints)]:
+            for comparison in self.constraints[self.z3_constraints:start]:
+                self.solver.add(to_z3(comparison, self.variables))
+            self.z3_constraints = start
+            if self.z3_scopes < len(self.scopes):
+                self.solver.push()
+                self.z3_scopes += 1
+
+    @STATS.timed("satisfiable")
+    def linear_check(self) -> Optional[SatResult]:
+        '''
+        Decide the asserted constraints with linear.solve, None if it can't
+        '''
+        if not self.linear:
+            return None
+        return linear_result(self.constraints)
+
+    @STATS.timed("satisfiable")
+    def solve_component(self, component: Comparisons) -> SatResult:
+        '''
+        Decide one independent component of a check on its own - with linear.solve, or in a z3 solver of its own
+        '''
+        result: Optional[SatResult] = linear_result(component) if self.linear else None
+        if result is not None:
+            return result
+        solver: Solver = Solver()
+        if self.budget is not None:
+            self.budget.limit(solver)
+        for comparison in component:
+            solver.add(to_z3(comparison, self.variables))
+        STATS.count("solver_calls")
+        checked: CheckSatResult = solver.check()
+        if checked == unknown:
+            raise Unknown(solver.reason_unknown())
+        return (True, input_values(solver.model())) if checked == sat else (False, None)
+
+    def check_components(self, components: List[Comparisons], model: bool = True) -> SatResult:
+        '''
+        Check a constraint set by its independent components, each cached by its own canonical form.\n
+        With model, the satisfiable components are solved even when cached, the model of the set is the
+        union of theirs
+        '''
+        STATS.count("components", len(components))
+        keys: List[FrozenSet[CanonicalComparison]] = [canonical_form(component) for component in components]
+        cached: List[Optional[bool]] = [self.cache.get(key) for key in keys]
+        if False in cached:
+            return False, None
+        values: Dict[str, int] = {}
+        # The components that aren't cached first, only they can still turn out unsatisfiable -
+        # the small ones first, they are the likeliest to be
+        for component, key, satisfiable in sorted(zip(components, keys, cached),
+                                                  key=lambda entry: (entry[2] is not None, len(entry[0]))):
+            if satisfiable and not model:
+                continue
+            result: SatResult = self.solve_component(component)
+            self.cache.put(key, result[0])
+            if not result[0]:
+                return result
+            values.update(result[1])
+        return True, values if model else None
+
+    @STATS.timed("satisfiable")
+    def z3_check(self) -> CheckSatResult:
+        STATS.count("solver_calls")
+        if self.budget is not None:
+            self.budget.limit(self.solver)
+        return self.solver.check()
+
+    def check(self, key_comparisons: Iterable[Tuple[str, Polynomial, Polynomial]], model: bool = True) -> SatResult:
+        '''
+        Check the constraints currently asserted in the solver, key_comparisons are the same
+        constraints as a list - they are only used to look the result up in the cache.\n
+        With a cache, constraints that split into independent components are checked component by component.\n
+        The cache only answers unsatisfiable, or satisfiable when model is False - a model needs a solve
+        '''
+        if self.budget is not None:
+            self.budget.check()
+        key: Optional[FrozenSet[CanonicalComparison]] = None
+        if self.cache is not None:
+            key_comparisons = list(key_comparisons)
+            components: List[Comparisons] = independent_components(key_comparisons)
+            if len(components) > 1:
+                return self.check_components(components, model)
+            key = canonical_form(key_comparisons)
+            cached: Optional[bool] = self.cache.get(key)
+            if cached is False:
+                return False, None
+            if cached and not model:
+                return True, None
+
+        result: Optional[SatResult] = self.linear_check()
+        if result is None:
+            self.sync()
+            result = (False, None)
+            checked: CheckSatResult = self.z3_check()
+            if checked == unknown:
+                raise Unknown(self.solver.reason_unknown())
+            if checked == sat:
+                result = (True, input_values(self.solver.model()))
+        if key is not None:
+            self.cache.put(key, result[0])
+        return result
+
+    def branch_feasible(self, path: Iterable[Tuple[str, Polynomial, Polynomial]] = ()) -> bool:
+        '''
+        Check if the branch that was just pushed can still be reached, path is its path condition.\n
+        Forks that are not on a checked level are assumed to be feasible
+        '''
+        if self.prune_every <= 0 or self.depth % self.prune_every != 0:
+            return True
+        if self.budget is not None:
+            self.budget.check()
+        if self.cache is not None:
+            feasible: bool = self.check(path, model=False)[0]
+        else:
+            decided: Optional[SatResult] = self.linear_check()
+            if decided is not None:
+                feasible = decided[0]
+            else:
+                self.sync()
+                # A fork z3 can't decide in time is kept
+                feasible = self.z3_check() != unsat
+        if not feasible:
+            STATS.count("pruned")
+        return feasible
+
+    def leaf_satisfiable(self, comparisons: Comparisons,
+                         path: Union[PathCondition, Comparisons] = ()) -> bool:
+        '''
+        Check if the asserted prefix together with comparisons has any solution,
+        comparisons are retracted again before returning.\n
+        path is the path condition of the leaf, only needed with a cache
+        '''
+        STATS.count("paths")
+        STATS.maximum("path_condition_length", len(path))
+        self.enter()
+        for comparison in comparisons:
+            self.add(comparison)
+        result, counterexample = self.check(chain(path, comparisons))
+        if result:
+            self.counterexample = counterexample
+        self.leave()
+        return result
+
+
+def to_values(program: CompiledProgram, variables: Variables) -> Values:
+    values: Values = program.environment()
+    for name, variable in variables.items():
+        if name in program.slots:
+            values[program.slots[name]] = variable.value
+    return values
 
 
 def is_assert_true(program: Program, commandsIndex: int, 
-           variables: Variables, comparisons: Comparisons) -> List[Variable]:
+           variables: Variables, comparisons: Union[Comparisons, PathCondition],
+           solver: Optional[PathSolver] = None, strategy: str = "dfs", max_frontier: Optional[int] = None) -> bool:
+    '''
+    Check if the assertion holds on every path from command commandsIndex on, starting with the values
+    of variables and the path condition comparisons.\n
+    strategy and max_frontier choose the order of the paths, see worklist.py
+    '''
+    compiled: CompiledProgram = compile_program(program)
+    if not isinstance(comparisons, PathCondition):
+        comparisons = PathCondition.from_list(comparisons)
+    if solver is None:
+        solver = PathSolver()
+        for comparison in comparisons:
+            solver.add(comparison)
+    return run(compiled, commandsIndex, to_values(compiled, variables), comparisons, solver, strategy, max_frontier)
 
-    for i in range(commandsIndex, len(program.commands)):
-        command = program.commands[i]
-        if type(command) == If:
-            return if_command(program, i, variables, comparisons)
-        elif type(command) == Assignment:
-            assignment(command, variables)
 
-    # Add the opposite of the post condition
-    _, comparisons_f, _, _ = branching(program.postCondition, variables, comparisons)
+def run(program: CompiledProgram, commandsIndex: int, values: Values, comparisons: PathCondition,
+        solver: PathSolver, strategy: str = "dfs", max_frontier: Optional[int] = None) -> bool:
+    '''
+    Explore the paths from command commandsIndex on, comparisons are already asserted in solver
+    '''
+    commands: Tuple[Union[Assign, Branch], ...] = program.commands
+    base: int = len(comparisons)
+    # The nodes of the path condition whose comparisons are pushed in solver, oldest first
+    pushed: List[PathCondition] = []
+    # Values lists of the states in the frontier and of the one being run, for the live_variables stat
+    environments: int = 1
 
-    # Add final values of variables
-    for var in variables.values():
-        comparisons_f.append(('==', Polynomial.from_one_var(var.name), var.value.deep_copy()))
+    def follow(path: PathCondition) -> None:
+        '''
+        Move the scopes of solver to path - pop back to the common prefix and push the rest.\n
+        Going depth first, that is one scope out and one in
+        '''
+        new: List[PathCondition] = []
+        node: PathCondition = path
+        while node.length > base and (node.length - base > len(pushed) or pushed[node.length - base - 1] is not node):
+            new.append(node)
+            node = node.parent
+        while len(pushed) > node.length - base:
+            pushed.pop()
+            solver.pop()
+        for node in reversed(new):
+            pushed.append(node)
+            solver.push(node.comparison)
 
-    # Now check if the constraints from the program AND the opposite of the post condition are satisfiable
-    all_variables: Set[str] = {prg_var + "_" for prg_var in program.variables}.union({x.name for x in variables.values()})
-    return not satisfiable(all_variables, comparisons_f)
+    def step(state: PathState) -> Optional[List[PathState]]:
+        commandsIndex, values, comparisons = state
+        follow(comparisons)
+        # A branch whose path condition has no solution can't violate the assertion
+        if len(comparisons) > base and not solver.branch_feasible(comparisons):
+            return []
+        for i in range(commandsIndex, len(commands)):
+            command = commands[i]
+            if type(command) == Branch:
+                return if_command(program, i, values, comparisons)
+            assignment(command, values, program.names)
 
+        # The path constraints are already asserted in the solver,
+        # check if they AND the opposite of the post condition are satisfiable
+        return None if solver.leaf_satisfiable(leaf_comparisons(program, values), comparisons) else []
 
+    def counted_step(state: PathState) -> Optional[List[PathState]]:
+        nonlocal environments
+        successors: Optional[List[PathState]] = step(state)
+        # At an if, the side that skips the body keeps the values of state - one list more, a leaf frees one
+        environments += len(successors or ()) - 1
+        STATS.maximum("live_variables", environments * len(program.names))
+        return successors
 
-def main() -> None:
-    for i in range(1, 31):
-        print("Test", i)
-        if is_assert_true(parse_file(f"programs/other/{i}.txt"), 0, {}, []):
-            print("ok")
+    try:
+        return explore((commandsIndex, values, comparisons), counted_step, strategy, lambda state: len(state[2]),
+                       max_frontier)
+    finally:
+        for _ in pushed:
+            solver.pop()
+
+
+def find_counterexample(program: Program, prune_every: int = 0, cache: Optional[SatCache] = None,
+                        budget: Optional[Budget] = None, strategy: str = "dfs",
+                        max_frontier: Optional[int] = None) -> Optional[Dict[str, int]]:
+    '''
+    Find inputs for which the assertion doesn't hold, None if it holds for all inputs.\n
+    Raises Unknown when budget runs out first
+    '''
+    solver: PathSolver = PathSolver(prune_every, cache, budget=budget)
+    if is_assert_true(program, 0, {}, [], solver, strategy, max_frontier):
+        return None
+    return solver.counterexample
+
+
+def leaf_comparisons(program: CompiledProgram, values: Values) -> Comparisons:
+    '''
+    The constraints a leaf adds to its path condition - the opposite of the post condition
+    and the final values of variables
+    '''
+    post: Cond = program.post
+    lhs: Polynomial = operand_value(post.l, values, program.names)
+    rhs: Polynomial = operand_value(post.r, values, program.names)
+    comparisons: Comparisons = [compare(post.opposite, lhs, rhs)]
+
+    for name, value in zip(program.names, values):
+        if value is not None:
+            comparisons.append(compare('==', Polynomial.from_one_var(name), value))
+    return comparisons
+
+
+def leaf_queries(program: Program, commandsIndex: int,
+                 variables: Variables, comparisons: Union[Comparisons, PathCondition]) -> Iterator[Comparisons]:
+    '''
+    Explore the same path tree as is_assert_true, but instead of solving the leaves
+    lazily yield the complete constraint set of every leaf.\n
+    The assertion holds iff none of them is satisfiable
+    '''
+    return (list(path) + leaf for path, leaf in leaf_paths(program, commandsIndex, variables, comparisons))
+
+
+def leaf_paths(program: Program, commandsIndex: int, variables: Variables,
+               comparisons: Union[Comparisons, PathCondition]) -> Iterator[Tuple[PathCondition, Comparisons]]:
+    '''
+    Like leaf_queries, but yield the path condition of every leaf and the comparisons the leaf adds to it
+    separately - consecutive leaves share the nodes of their common prefix
+    '''
+    compiled: CompiledProgram = compile_program(program)
+    if not isinstance(comparisons, PathCondition):
+        comparisons = PathCondition.from_list(comparisons)
+    return compiled_leaf_paths(compiled, commandsIndex, to_values(compiled, variables), comparisons)
+
+
+def compiled_leaf_paths(program: CompiledProgram, commandsIndex: int, values: Values,
+                        comparisons: PathCondition) -> Iterator[Tuple[PathCondition, Comparisons]]:
+    commands: Tuple[Union[Assign, Branch], ...] = program.commands
+    # Depth first, like is_assert_true
+    stack: List[PathState] = [(commandsIndex, values, comparisons)]
+    while stack:
+        commandsIndex, values, comparisons = stack.pop()
+        for i in range(commandsIndex, len(commands)):
+            command = commands[i]
+            if type(command) == Branch:
+                stack.extend(reversed(if_command(program, i, values, comparisons)))
+                break
+            assignment(command, values, program.names)
         else:
-            print("nok")
-        
-        # print("-------------------------------------------")
+            yield comparisons, leaf_comparisons(program, values)
+
+
+Verdict = Tuple[str, Optional[Dict[str, int]]]
+
+# Shared by all programs verified in this process, they often repeat the same constraint sets
+sat_cache: SatCache = SatCache()
+
+
+# Rewrites of a program that keep its verdict, run before the engine in the order they are given
+PASSES = ("fold", "slice")
+
+
+def run_passes(program: Program, passes: Tuple[str, ...]) -> Program:
+    for name in passes:
+        if name == "slice":
+            import slicing
+            program = slicing.slice_program(program)
+        elif name == "fold":
+            import folding
+            program = folding.fold_program(program)
+        else:
+            raise ValueError(f"Unknown pass {name}")
+    return program
+
+
+def verify_file(filename: Union[str, Program], engine: str = "paths", prune_every: int = 0, jobs: int = 1,
+                passes: Tuple[str, ...] = (), budget: Optional[Budget] = None, strategy: str = "dfs",
+                max_frontier: Optional[int] = None) -> Verdict:
+    '''
+    Verify one program file and return its verdict - "ok", "nok", "unknown" (out of budget)
+    or "error: <reason>", together with a counterexample if the engine found one.\n
+    filename can also be the program already parsed from the file.\n
+    strategy and max_frontier are the order the paths engines explore the paths in, see worklist.py
+    '''
+    if isinstance(filename, Program):
+        return verify_program(filename, engine, prune_every, jobs, passes, budget, strategy, max_frontier)
+    try:
+        program: Program = parse_file(filename)
+    except Exception as e:
+        return f"error: {type(e).__name__}: {e}", None
+    return verify_program(program, engine, prune_every, jobs, passes, budget, strategy, max_frontier)
+
+
+def verify_program(program: Program, engine: str = "paths", prune_every: int = 0, jobs: int = 1,
+                   passes: Tuple[str, ...] = (), budget: Optional[Budget] = None, strategy: str = "dfs",
+                   max_frontier: Optional[int] = None) -> Verdict:
+    '''
+    Verify a parsed program, the same as verify_file.\n
+    A counterexample of a program rewritten by passes leaves out the inputs that don't matter.\n
+    The seconds of budget are counted from the start of this verification
+    '''
+    counterexample: Optional[Dict[str, int]] = None
+    try:
+        if budget is not None:
+            budget.start()
+        program = run_passes(program, passes)
+        if engine == "merging":
+            import merging
+            counterexample = merging.find_counterexample(program, budget)
+            result: bool = counterexample is None
+        elif engine == "fanout":
+            import parallel
+            result = parallel.is_assert_true(program, jobs, budget=budget)
+        elif engine == "tiered":
+            import tiered
+            counterexample = tiered.find_counterexample(program, prune_every, sat_cache, budget, strategy, max_frontier)
+            result = counterexample is None
+        else:
+            counterexample = find_counterexample(program, prune_every, sat_cache, budget, strategy, max_frontier)
+            result = counterexample is None
+    except Unknown:
+        return "unknown", None
+    except Exception as e:
+        return f"error: {type(e).__name__}: {e}", None
+    return "ok" if result else "nok", counterexample
+
+
+def verify_file_with_stats(filename: Union[str, Program], engine: str = "paths", prune_every: int = 0, jobs: int = 1,
+                           passes: Tuple[str, ...] = (), budget: Optional[Budget] = None, strategy: str = "dfs",
+                           max_frontier: Optional[int] = None) -> Tuple[Verdict, Dict[str, Any]]:
+    return collect(verify_file, filename, engine, prune_every, jobs, passes, budget, strategy, max_frontier)
+
+
+def verify_program_with_stats(program: Program, engine: str = "paths", prune_every: int = 0, jobs: int = 1,
+                              passes: Tuple[str, ...] = (), budget: Optional[Budget] = None, strategy: str = "dfs",
+                              max_frontier: Optional[int] = None) -> Tuple[Verdict, Dict[str, Any]]:
+    return collect(verify_program, program, engine, prune_every, jobs, passes, budget, strategy, max_frontier)
+
+
+def verify_files(files: List[str], engine: str, prune_every: int, jobs: int,
+                 cache: Optional['VerdictCache'] = None, stats: Optional[Stats] = None,
+                 passes: Tuple[str, ...] = (), budget: Optional[Budget] = None, strategy: str = "dfs",
+                 max_frontier: Optional[int] = None) -> Iterator[Verdict]:
+    '''
+    Verify the program files and yield their verdicts in the same order.\n
+    Programs found in the cache are answered without running any engine.\n
+    The stats recorded while verifying each program (in whichever process it ran) are added to stats
+    '''
+    cached: List[Optional[Verdict]] = [None] * len(files)
+    programs: List[Optional[Program]] = [None] * len(files)
+    if cache is not None:
+        for i, filename in enumerate(files):
+            try:
+                programs[i] = parse_file(filename)
+            except Exception:
+                continue
+            cached[i] = cache.get(programs[i])
+    # The programs parsed for the cache aren't parsed again
+    misses: List[Union[str, Program]] = [filename if program is None else program
+                                         for filename, program, verdict in zip(files, programs, cached)
+                                         if verdict is None]
+
+    verify: Callable = verify_file if stats is None else verify_file_with_stats
+    executor: Optional[ProcessPoolExecutor] = None
+    if engine == "fanout":
+        # The workers are used inside each program, so the programs themselves go one by one
+        verdicts = (verify(filename, engine, prune_every, jobs, passes, budget, strategy, max_frontier)
+                    for filename in misses)
+    elif jobs > 1 and len(misses) > 1:
+        executor = ProcessPoolExecutor(jobs)
+        chunksize: int = max(1, len(misses) // (jobs * 4))
+        verdicts = executor.map(verify, misses, [engine] * len(misses), [prune_every] * len(misses),
+                                [1] * len(misses), [passes] * len(misses), [budget] * len(misses),
+                                [strategy] * len(misses), [max_frontier] * len(misses), chunksize=chunksize)
+    else:
+        verdicts = (verify(filename, engine, prune_every, 1, passes, budget, strategy, max_frontier)
+                    for filename in misses)
+
+    # map yields in input order, so the verdicts come out in the same order the programs were given
+    try:
+        for program, verdict in zip(programs, cached):
+            if verdict is None:
+                verdict = next(verdicts)
+                if stats is not None:
+                    verdict, recorded = verdict
+                    stats.merge(recorded)
+                if cache is not None and program is not None and verdict[0] in ("ok", "nok"):
+                    cache.put(program, *verdict)
+            yield verdict
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def verify_programs(programs: Iterable[Program], engine: str, prune_every: int, jobs: int,
+                    cache: Optional['VerdictCache'] = None, stats: Optional[Stats] = None,
+                    passes: Tuple[str, ...] = (), budget: Optional[Budget] = None, strategy: str = "dfs",
+                    max_frontier: Optional[int] = None) -> Iterator[Verdict]:
+    '''
+    Verify programs while they are being read (e.g. from parse_corpus) and yield their verdicts
+    in the same order, like verify_files.\n
+    At most 4 programs per worker are in flight, so the stream is never read far ahead
+    '''
+    verify: Callable = verify_program if stats is None else verify_program_with_stats
+
+    def finish(program: Program, verdict: Any) -> Verdict:
+        if stats is not None:
+            verdict, recorded = verdict
+            stats.merge(recorded)
+        if cache is not None and verdict[0] in ("ok", "nok"):
+            cache.put(program, *verdict)
+        return verdict
+
+    if engine == "fanout" or jobs <= 1:
+        for program in programs:
+            cached: Optional[Verdict] = None if cache is None else cache.get(program)
+            yield cached if cached is not None else finish(program, verify(program, engine, prune_every, jobs, passes,
+                                                                          budget, strategy, max_frontier))
+        return
+
+    with ProcessPoolExecutor(jobs) as executor:
+        # Programs with their cached verdict or the future of their verdict, in input order
+        pending: deque = deque()
+
+        def drain(keep: int) -> Iterator[Verdict]:
+            while len(pending) > keep or (pending and pending[0][2] is None):
+                program, cached, future = pending.popleft()
+                yield cached if future is None else finish(program, future.result())
+
+        programs = iter(programs)
+        while True:
+            try:
+                program = next(programs)
+            except StopIteration:
+                break
+            except RuntimeError:
+                # The stream broke (e.g. a syntax error), the programs read before it still get their verdicts
+                yield from drain(0)
+                raise
+            cached = None if cache is None else cache.get(program)
+            pending.append((program, cached, None if cached is not None
+                            else executor.submit(verify, program, engine, prune_every, 1, passes, budget,
+                                                 strategy, max_frontier)))
+            yield from drain(4 * jobs)
+        yield from drain(0)
+
+
+def natural_key(path: str) -> List[Union[int, str]]:
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", path)]
+
+
+def expand_paths(patterns: List[str]) -> List[str]:
+    '''
+    Turn files, directories (all their .txt programs) and glob patterns into a list of program files
+    '''
+    files: List[str] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(sorted(glob.glob(os.path.join(pattern, "*.txt")), key=natural_key))
+        elif glob.has_magic(pattern):
+            files.extend(sorted(glob.glob(pattern, recursive=True), key=natural_key))
+        else:
+            files.append(pattern)
+    return files
+
+
+def read_expectations(filename: str) -> Dict[str, str]:
+    '''
+    Read expected verdicts in the format of correct_answers.txt - "<key> <verdict>" per line,
+    where key is a program path or its number ("3." for 3.txt).\n
+    Verdicts marked with * are known limitations of the engine and are not checked
+    '''
+    expectations: Dict[str, str] = {}
+    with open(filename) as f:
+        for line in f:
+            tokens = line.split()
+            if len(tokens) != 2 or "*" in tokens[1]:
+                continue
+            expectations[tokens[0].rstrip(".")] = tokens[1]
+    return expectations
+
+
+def expected_verdict(filename: str, expectations: Dict[str, str]) -> Optional[str]:
+    if filename in expectations:
+        return expectations[filename]
+    return expectations.get(os.path.splitext(os.path.basename(filename))[0])
+
+
+def export_queries(files: List[str], corpus: Optional[str], directory: str, incremental: bool,
+                   passes: Tuple[str, ...]) -> int:
+    '''
+    Write the leaf queries of the programs of files and corpus to directory (smtlib.export)
+    '''
+    import smtlib
+
+    def programs() -> Iterator[Tuple[str, Callable[[], Program]]]:
+        for filename in files:
+            yield filename, functools.partial(parse_file, filename)
+        if corpus:
+            for program in parse_corpus(corpus):
+                yield f"{corpus}:{program.line}", functools.partial(lambda program: program, program)
+
+    errors: int = 0
+    try:
+        for name, parse in programs():
+            try:
+                written: List[str] = smtlib.export(run_passes(parse(), passes), name, directory, incremental)
+            except Exception as e:
+                errors += 1
+                print(name, f"error: {type(e).__name__}: {e}", flush=True)
+                continue
+            print(name, f"{len(written)} file{'s' if len(written) != 1 else ''}", flush=True)
+    except RuntimeError as e:
+        # The rest of the corpus can't be read after a syntax error
+        print(f"{corpus}: error: {e}", flush=True)
+        errors += 1
+    return 1 if errors else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verify that the assertion of each program holds for all inputs.")
+    parser.add_argument("programs", nargs="*",
+                        help="program files, directories of .txt programs or glob patterns "
+                             "(default: programs/other, unless --corpus is given)")
+    parser.add_argument("--corpus", metavar="FILE",
+                        help="also verify every program of FILE, which holds any number of them "
+                             "(optionally separated by --- lines), - reads stdin")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--engine", choices=("paths", "merging", "fanout", "tiered"), default="paths",
+                        help="enumerate paths (main.py), merge them into one formula (merging.py) "
+                             "solve the leaves of one program across the workers (parallel.py) "
+                             "or try the interval analysis before z3 (tiered.py)")
+    parser.add_argument("--prune-every", type=int, default=0,
+                        help="check forks for feasibility every n-th level, 0 never checks")
+    parser.add_argument("--slice", action="store_true",
+                        help="drop the commands that can't affect the assertion before verifying (slicing.py), "
+                             "--stats reports the paths saved as max sliced_paths_factor")
+    parser.add_argument("--fold", action="store_true",
+                        help="propagate constants and fold the ifs that don't depend on input before verifying "
+                             "(folding.py), runs before --slice")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS",
+                        help="time limit of each z3 query, a program with a query z3 can't decide in time is unknown")
+    parser.add_argument("--budget", type=float, metavar="SECONDS",
+                        help="time limit of each program, a program that takes longer is unknown")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="dfs",
+                        help="order the paths are explored in - depth first, breadth first "
+                             "or the shortest path condition first (worklist.py)")
+    parser.add_argument("--max-frontier", type=int, metavar="N",
+                        help="at most N paths waiting in the frontier, the rest are explored depth first")
+    parser.add_argument("--smt2", metavar="DIR",
+                        help="instead of verifying, write the leaf queries of each program to DIR as SMT-LIB2 files, "
+                             "solve them with smtlib.py")
+    parser.add_argument("--smt2-script", action="store_true",
+                        help="with --smt2, one incremental script per program instead of a file per leaf")
+    parser.add_argument("--expect", metavar="FILE",
+                        help="compare verdicts with the expected ones, e.g. correct_answers.txt")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="SQLite file with the verdicts of already verified programs")
+    parser.add_argument("--cache-size", type=int, default=100000,
+                        help="maximum number of programs kept in the cache")
+    parser.add_argument("--stats", choices=("text", "json"),
+                        help="print paths, forks, solver calls and time spent per stage to stderr")
+    args = parser.parse_args(argv)
+
+    if not args.programs and not args.corpus:
+        args.programs = ["programs/other"]
+    files: List[str] = expand_paths(args.programs)
+    passes: Tuple[str, ...] = tuple(name for name in PASSES if getattr(args, name))
+    if args.smt2:
+        return export_queries(files, args.corpus, args.smt2, args.smt2_script, passes)
+    expectations: Dict[str, str] = read_expectations(args.expect) if args.expect else {}
+    cache: Optional['VerdictCache'] = None
+    if args.cache:
+        from cache import VerdictCache
+        cache = VerdictCache(args.cache, args.cache_size)
+
+    stats: Optional[Stats] = Stats() if args.stats else None
+    budget: Optional[Budget] = None
+    if args.timeout is not None or args.budget is not None:
+        budget = Budget(args.timeout, args.budget)
+    verdicts: Iterator[Verdict] = verify_files(files, args.engine, args.prune_every, args.jobs, cache, stats, passes,
+                                               budget, args.strategy, args.max_frontier)
+
+    mismatches: int = 0
+    for filename, (verdict, _) in zip(files, verdicts):
+        expected: Optional[str] = expected_verdict(filename, expectations)
+        if expected is not None and expected != verdict:
+            mismatches += 1
+            print(filename, verdict, f"(expected {expected})", flush=True)
+        else:
+            print(filename, verdict, flush=True)
+
+    if args.corpus:
+        corpus: Iterator[Program] = parse_corpus(args.corpus)
+        starts: deque = deque()
+
+        def numbered() -> Iterator[Program]:
+            for program in corpus:
+                starts.append(program.line)
+                yield program
+
+        try:
+            for verdict, _ in verify_programs(numbered(), args.engine, args.prune_every, args.jobs, cache, stats,
+                                              passes, budget, args.strategy, args.max_frontier):
+                print(f"{args.corpus}:{starts.popleft()}", verdict, flush=True)
+        except RuntimeError as e:
+            # The rest of the corpus can't be read after a syntax error
+            print(f"{args.corpus}: error: {e}", flush=True)
+            mismatches += 1
+
+    if cache is not None:
+        cache.close()
+    if args.expect:
+        print(mismatches, "mismatches")
+    if args.stats == "json":
+        print(json.dumps(stats.to_dict()), file=sys.stderr)
+    elif args.stats == "text":
+        print(stats, file=sys.stderr)
+    return 1 if mismatches else 0
+
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import sys
+
+from parser_1 import *
+from typing import Dict, List, Optional, Tuple
+from main import Budget, Unknown, input_values
+from stats import STATS
+from z3 import (Int, IntVal, If as Ite, And, Not, Solver, unsat, unknown, simplify, substitute,
+                is_int_value, is_app_of, Z3_OP_ITE, ArithRef, BoolRef, ExprRef, CheckSatResult)
+
+# State merging counterpart of main.is_assert_true.
+# Instead of forking at every if, both sides of the if are merged back into one
+# symbolic state where every variable the body changes holds If(condition, body value, old value).
+# The whole program then becomes a single formula and the negated post condition is solved once,
+# so the work is linear in the number of ifs instead of one solver query per path.
+
+State = Dict[str, ArithRef]
+
+
+def to_term(x: Value, state: State) -> ArithRef:
+    if isinstance(x, str):
+        return state[x]
+    return IntVal(x)
+
+
+def to_condition(condition: Comp, state: State) -> BoolRef:
+    lhs: ArithRef = to_term(condition.l, state)
+    rhs: ArithRef = to_term(condition.r, state)
+    op: str = condition.op
+    return lhs < rhs if op == '<' else \
+           lhs > rhs if op == '>' else \
+           lhs <= rhs if op == '<=' else \
+           lhs >= rhs if op == '>=' else \
+           lhs == rhs if op == '==' else \
+           lhs != rhs
+
+
+def find_ite(term: ExprRef) -> Optional[ExprRef]:
+    if is_app_of(term, Z3_OP_ITE):
+        return term
+    for child in term.children():
+        ite = find_ite(child)
+        if ite is not None:
+            return ite
+    return None
+
+
+def cases(term: ArithRef) -> List[Tuple[List[BoolRef], ArithRef]]:
+    '''
+    Split a merged value into the values it has on the individual paths,
+    each together with the guards under which it's taken
+    '''
+    ite = find_ite(term)
+    if ite is None:
+        return [([], term)]
+    condition, then_term, else_term = ite.children()
+    return [([condition] + guards, value)
+            for guards, value in cases(simplify(substitute(term, (ite, then_term))))] \
+        + [([Not(condition)] + guards, value)
+           for guards, value in cases(simplify(substitute(term, (ite, else_term))))]
+
+
+def multiply(lhs: ArithRef, rhs: ArithRef) -> ArithRef:
+    '''
+    Multiply 2 merged values the way main.Polynomial does on every path -
+    only when one side of the product is a constant on that path
+    '''
+    lhs, rhs = simplify(lhs), simplify(rhs)
+    if is_int_value(lhs) or is_int_value(rhs):
+        return lhs * rhs
+
+    products: List[Tuple[List[BoolRef], ArithRef]] = []
+    supported: bool = True
+    for lhs_guards, lhs_value in cases(lhs):
+        for rhs_guards, rhs_value in cases(rhs):
+            if is_int_value(lhs_value) or is_int_value(rhs_value):
+                products.append((lhs_guards + rhs_guards, lhs_value * rhs_value))
+            else:
+                products.append((lhs_guards + rhs_guards, lhs_value))
+                supported = False
+    if not supported:
+        print("Multiplication of 2 variables is not supported")
+
+    result: ArithRef = products[-1][1]
+    for guards, value in reversed(products[:-1]):
+        result = Ite(And(guards), value, result)
+    return result
+
+
+@STATS.timed("assignment")
+def assignment(command: Assignment, state: State) -> None:
+    rhs = command.rhs
+    if isinstance(rhs, Expr):
+        rhs_l: ArithRef = to_term(rhs.l, state)
+        rhs_r: ArithRef = to_term(rhs.r, state)
+        if rhs.op == '+':
+            value: ArithRef = rhs_l + rhs_r
+        elif rhs.op == '-':
+            value = rhs_l - rhs_r
+        elif rhs.op == '*':
+            value = multiply(rhs_l, rhs_r)
+        else:
+            print("Operator " + rhs.op + " is not supported")
+            value = rhs_l
+    elif isinstance(rhs, Input):
+        value = Int(command.lhs + "_")
+    else:
+        value = to_term(rhs, state)
+
+    state[command.lhs] = value
+
+
+def if_command(command: If, state: State) -> None:
+    '''
+    Execute the if body on a copy of the state and merge both sides back into state
+    '''
+    condition: BoolRef = to_condition(command.condition, state)
+    state_if: State = dict(state)
+    for assignment_command in command.body:
+        assignment(assignment_command, state_if)
+
+    for name, value_if in state_if.items():
+        value_nif: Optional[ArithRef] = state.get(name)
+        if value_nif is None or value_nif.eq(value_if):
+            state[name] = value_if
+        else:
+            state[name] = Ite(condition, value_if, value_nif)
+
+
+def find_counterexample(program: Program, budget: Optional[Budget] = None) -> Optional[Dict[str, int]]:
+    '''
+    Find inputs for which the assertion doesn't hold, None if it holds for all inputs.\n
+    Raises Unknown if z3 can't decide it within budget
+    '''
+    state: State = {}
+    for command in program.commands:
+        if type(command) == If:
+            if_command(command, state)
+        elif type(command) == Assignment:
+            assignment(command, state)
+
+    # The assertion holds iff there are no inputs for which its opposite is satisfiable
+    solver = Solver()
+    if budget is not None:
+        budget.limit(solver)
+    solver.add(Not(to_condition(program.postCondition, state)))
+    result: CheckSatResult = check(solver)
+    if result == unsat:
+        return None
+    if result == unknown:
+        raise Unknown(solver.reason_unknown())
+    return input_values(solver.model())
+
+
+@STATS.timed("satisfiable")
+def check(solver: Solver) -> CheckSatResult:
+    STATS.count("solver_calls")
+    return solver.check()
+
+
+def is_assert_true(program: Program) -> bool:
+    return find_counterexample(program) is None
+
+
+if __name__ == "__main__":
+    for filename in sys.argv[1:]:
+        print(filename, "ok" if is_assert_true(parse_file(filename)) else "nok")
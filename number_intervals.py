@@ -1,6 +1,9 @@
 from parser_1 import *
+from ir import *
+from stats import STATS
+from worklist import explore
 
-from typing import Optional, Dict, Tuple
+from typing import Optional, Tuple, List, Union
 
 
 
@@ -14,6 +17,10 @@ class Variable:
         self.value: Optional[int] = value
         self.lb_included: bool = lb_included
         self.rb_included: bool = rb_included
+        STATS.variable_created()
+
+    def __del__(self):
+        STATS.variable_freed()
 
     def set_value(self, value: int) -> None:
         self.value = value
@@ -119,278 +126,352 @@ class Variable:
         return self.set_boundless()
 
 
-    def __eq__(self, o) -> Tuple['Variable', Optional['Variable']]:
-        if isinstance(o, int):
-            if self.perfect():
-                if self.value == o:
-                    return self.copy(), None
-                else:
-                    return NOTHING, None
-            if self.left_bound < o and self.right_bound > o \
-                or (self.lb_included and o == self.left_bound) \
-                or (self.rb_included and o == self.right_bound):
-                return Variable(self.string, o, o, o, True, True), None
-            return NOTHING, None
-        if isinstance(o, Input):
-            return self.copy(), None
+    def lower(self) -> int:
+        '''
+        Smallest integer in the interval, -inf if it's unbounded
+        '''
+        if self.left_bound == float("-inf") or self.lb_included:
+            return self.left_bound
+        return self.left_bound + 1
+
+    def upper(self) -> int:
+        '''
+        Largest integer in the interval, inf if it's unbounded
+        '''
+        if self.right_bound == float("inf") or self.rb_included:
+            return self.right_bound
+        return self.right_bound - 1
+
+    @staticmethod
+    def from_bounds(string: str, lower: int, upper: int) -> 'Variable':
+        '''
+        The integers from lower to upper, both included
+        '''
+        if lower > upper:
+            return Variable(string, None, 0, 0, False, False)
+        return Variable(string, lower if lower == upper else None, lower, upper,
+                        lower != float("-inf"), upper != float("inf"))
+
+    def normalized(self, string: str) -> 'Variable':
+        '''
+        Copy named string with integer bounds that are included, and the value set iff there is a single one
+        '''
+        return Variable.from_bounds(string, self.lower(), self.upper())
+
+    def __mul__(self, o: 'Variable') -> 'Variable':
+        # 0 * inf is 0 - the infinite bound stands for arbitrarily large finite values
+        products: List[int] = [0 if a == 0 or b == 0 else a * b
+                               for a in (self.lower(), self.upper()) for b in (o.lower(), o.upper())]
+        return Variable.from_bounds(self.string, min(products), max(products))
+
+    def refine(self, op: str, o: 'Variable') -> Tuple['Variable', 'Variable']:
+        '''
+        Narrow self and o to the values for which "self op o" can hold.\n
+        The bounds are integers, so a strict comparison moves them by 1
+        '''
+        lower, upper, o_lower, o_upper = self.lower(), self.upper(), o.lower(), o.upper()
+        if op == '<':
+            upper, o_lower = min(upper, o_upper - 1), max(o_lower, lower + 1)
+        elif op == '<=':
+            upper, o_lower = min(upper, o_upper), max(o_lower, lower)
+        elif op == '>':
+            lower, o_upper = max(lower, o_lower + 1), min(o_upper, upper - 1)
+        elif op == '>=':
+            lower, o_upper = max(lower, o_lower), min(o_upper, upper)
+        elif op == '==':
+            lower = o_lower = max(lower, o_lower)
+            upper = o_upper = min(upper, o_upper)
+        elif op == '!=':
+            # Only a single value on one side can cut the other one, and only at its ends
+            if o_lower == o_upper:
+                lower += lower == o_lower
+                upper -= upper == o_lower
+            if lower == upper:
+                o_lower += o_lower == lower
+                o_upper -= o_upper == lower
+        return Variable.from_bounds(self.string, lower, upper), Variable.from_bounds(o.string, o_lower, o_upper)
+
+    def compare(self, op: str, o) -> Tuple['Variable', Optional['Variable']]:
         if isinstance(o, Variable):
-            if self.perfect() and o.perfect():
-                if self.value == o.value:
-                    return self.copy(), o.copy()
-                else:
-                    return NOTHING, NOTHING
-            if self.perfect():
-                return o == self.value
-            if o.perfect():
-                return self == o.value
-            
-            self_copy: Variable = self.copy()
-            o_copy: Variable = o.copy()
-            if self.left_bound < o.left_bound:
-                self_copy.left_bound = o.left_bound
-                self_copy.lb_included = o.lb_included
-            elif self.left_bound > o.left_bound:
-                o_copy.left_bound = self.left_bound
-                o_copy.lb_included = self.lb_included
-            else:
-                self_copy.lb_included = self.lb_included and o.lb_included
-                o_copy.lb_included = self.lb_included and o.lb_included
-
-            if self.right_bound < o.right_bound:
-                o_copy.right_bound = self.right_bound
-                o_copy.rb_included = self.rb_included
-            elif self.right_bound > o.right_bound:
-                self_copy.right_bound = o.right_bound
-                self_copy.rb_included = o.rb_included
-            else:
-                self_copy.rb_included = self.rb_included and o.rb_included
-                o_copy.rb_included = self.rb_included and o.rb_included
-            return self_copy, o_copy
-
-
-    def __lt__(self, o) -> Tuple['Variable', 'Variable']:
+            return self.refine(op, o)
         if isinstance(o, int):
-            if self.perfect():
-                if self.value < o:
-                    return self.copy(), None
-                else:
-                    return NOTHING, None
-
-            if self.left_bound >= o:
-                return NOTHING, None
-            
-            ret: Variable = self.copy()
-            ret.right_bound = o
-            ret.rb_included = False
-            return ret, None
-
-        elif type(o) == Variable:
-            self_copy: Variable = self.copy()
-            o_copy: Variable = o.copy()
-            self_copy.right_bound = min(o.right_bound, self_copy.right_bound)
-            if self_copy.rb_included:
-                self_copy.rb_included = o.rb_included
-
-            o_copy.left_bound = max(o.left_bound, self_copy.left_bound)
-            if o_copy.lb_included:
-                o_copy.lb_included = self_copy.lb_included
-            return self_copy, o_copy
-    
+            return self.refine(op, Variable.from_bounds("", o, o))[0], None
         # elif type(o) == Input:
         return self.copy(), None
 
+    def __eq__(self, o) -> Tuple['Variable', Optional['Variable']]:
+        return self.compare('==', o)
 
-    def __le__(self, o) -> Tuple['Variable', 'Variable']:
-        ret, o = self < o
-        ret.rb_included = True
-        return ret, o
+    def __ne__(self, o) -> Tuple['Variable', Optional['Variable']]:
+        return self.compare('!=', o)
 
+    def __lt__(self, o) -> Tuple['Variable', Optional['Variable']]:
+        return self.compare('<', o)
 
-    def __gt__(self, o) -> 'Variable':
-        if isinstance(o, int):
-            if self.perfect():
-                print(self)
-                if self.value > o:
-                    return self.copy(), None
-                else:
-                    return NOTHING, None
-
-            if self.right_bound <= o:
-                return NOTHING, None        
-            ret: Variable = self.copy()
-            ret.left_bound = o
-            ret.lb_included = False
-            return ret, None
-        
-        elif type(o) == Variable:
-            self_copy: Variable = self.copy()
-            o_copy: Variable = o.copy()
-            self_copy.left_bound = max(o.left_bound, self_copy.left_bound)
-            if self_copy.lb_included:
-                self_copy.lb_included = o.lb_included
+    def __le__(self, o) -> Tuple['Variable', Optional['Variable']]:
+        return self.compare('<=', o)
 
-            o_copy.right_bound = min(o.right_bound, self_copy.right_bound)
-            if o_copy.rb_included:
-                o_copy.rb_included = self_copy.rb_included
-            return self_copy, o_copy
-
-        # elif type(o) == Input:
-        return self.copy(), None
+    def __gt__(self, o) -> Tuple['Variable', Optional['Variable']]:
+        return self.compare('>', o)
 
+    def __ge__(self, o) -> Tuple['Variable', Optional['Variable']]:
+        return self.compare('>=', o)
 
-    def __ge__(self, o) -> 'Variable':
-        ret, o = self > o
-        ret.lb_included = True
-        return ret, o
-    
     def possible(self) -> bool:
-        if self.left_bound > self.right_bound:
-            return False
-        if self.left_bound == self.right_bound and not self.lb_included and not self.rb_included:
-            return False
-        return True
+        return self.lower() <= self.upper()
+
+    def join(self, o: 'Variable') -> 'Variable':
+        '''
+        Interval hull - the smallest interval holding both self and o
+        '''
+        return Variable.from_bounds(self.string, min(self.lower(), o.lower()), max(self.upper(), o.upper()))
 
 
 NOTHING = Variable("-", None, 0, 0, False, False)
 
 
-def comp(variables: Dict[str, Variable], condition: Comp) -> Optional[Tuple[Variable, Variable]]:
-    right: Variable = NOTHING.copy()
-    left: Variable = NOTHING.copy()
-    right_new: Optional[Variable] = None
-    left_new: Variable = NOTHING.copy()
-    if isinstance(condition.r, str):
-        right = variables[condition.r]
-    else:
-        right = condition.r
-    if isinstance(condition.l, str):
-        left = variables[condition.l]
-    else:
-        left = condition.l
-    if condition.op == '==':
-        left_new, right_new = left == right
-    if condition.op == '<':
-        left_new, right_new = left < right
-    if condition.op == '>':
-        left_new, right_new = left > right
-    if condition.op == '<=':
-        left_new, right_new = left <= right
-    if condition.op == '>=':
-        left_new, right_new = left >= right
-    
-    if not left_new.possible():
+# Intervals of the variables of a CompiledProgram, by slot
+Intervals = List[Optional[Variable]]
+
+
+def operand(x: Operand, variables: Intervals, names: Tuple[str, ...]) -> Union[Variable, int]:
+    '''
+    The interval of a variable, a constant as it is, and a nameless boundless interval for input()
+    '''
+    kind, value = x
+    if kind == SLOT:
+        variable: Optional[Variable] = variables[value]
+        if variable is None:
+            raise KeyError(names[value])
+        return variable
+    if kind == INPUT:
+        return Variable()
+    return value
+
+
+def oriented(condition: Cond) -> Cond:
+    '''
+    The same condition, with a variable on the left side whenever there is one
+    '''
+    if condition.l[0] == CONSTANT and condition.r[0] != CONSTANT:
+        return condition.mirrored()
+    return condition
+
+
+def comp(variables: Intervals, condition: Cond, names: Tuple[str, ...]) -> Optional[List[Tuple[int, Variable]]]:
+    '''
+    Narrow the intervals of the variables in condition to the values for which it can hold.\n
+    Returns the narrowed variables with their slots, None if the condition can't hold at all
+    '''
+    condition = oriented(condition)
+    left = operand(condition.l, variables, names)
+    right = operand(condition.r, variables, names)
+    if isinstance(left, int):
+        # Both sides are constants
+        return [] if holds(condition.op, Variable.from_bounds("", left, left),
+                           Variable.from_bounds("", right, right)) else None
+
+    left_new, right_new = left.compare(condition.op, right)
+    narrowed: List[Tuple[Operand, Variable]] = [(condition.l, left_new)]
+    if right_new is not None:
+        narrowed.append((condition.r, right_new))
+    if not all(variable.possible() for _, variable in narrowed):
         return None
-    if right_new is not None and not right_new.possible():
+    return [(slot, variable) for (kind, slot), variable in narrowed if kind == SLOT]
+
+
+def holds(op: str, left: Variable, right: Variable) -> bool:
+    '''
+    Check if "left op right" holds for all the values in the intervals
+    '''
+    if op == '<':
+        return left.upper() < right.lower()
+    if op == '<=':
+        return left.upper() <= right.lower()
+    if op == '>':
+        return left.lower() > right.upper()
+    if op == '>=':
+        return left.lower() >= right.upper()
+    if op == '==':
+        return left.lower() == left.upper() == right.lower() == right.upper()
+    return left.upper() < right.lower() or left.lower() > right.upper()
+
+
+def join(variables: Intervals, o_variables: Intervals) -> Intervals:
+    '''
+    Slot by slot interval hull of the states at the end of 2 paths.\n
+    A variable without a value on one of them has none after the join either
+    '''
+    return [None if variable is None or o_variable is None else variable.join(o_variable)
+            for variable, o_variable in zip(variables, o_variables)]
+
+
+def taken(command: Branch, comp_result: Optional[List[Tuple[int, Variable]]], variables: Intervals,
+          names: Tuple[str, ...]) -> Optional[Intervals]:
+    '''
+    The state after the body of the if, from the comp of its condition. None if the condition can't hold
+    '''
+    if comp_result is None:
+        STATS.count("pruned")
         return None
-    
-    return left_new, right_new
-
-
-def branching(program: Program, commandsIndex: int, variables: Dict[str, Variable]) -> bool:
-    comparison_command: Command = program.commands[commandsIndex]
-    comp_result: Optional[Tuple[Variable, Variable]] = comp(variables, comparison_command.condition)
+    new_variables: Intervals = variables[:]
+    for slot, variable in comp_result:
+        new_variables[slot] = variable
+    for assignment_command in command.body:
+        assignment(assignment_command, new_variables, names)
+    return new_variables
+
+
+@STATS.timed("branching")
+def joined_branching(command: Branch, variables: Intervals, names: Tuple[str, ...]) -> Optional[Intervals]:
+    '''
+    Join mode - the state after the if joins both sides of it instead of following them separately.\n
+    None if neither side can be taken
+    '''
+    STATS.count("forks")
+    condition: Cond = oriented(command.condition)
+    new_variables: Optional[Intervals] = taken(command, comp(variables, condition, names), variables, names)
+    # The hull of the except_var pieces of the split mode is the interval narrowed by the opposite condition
+    comp_result: Optional[List[Tuple[int, Variable]]] = comp(variables, Cond(condition.opposite, condition.l, condition.r),
+                                                             names)
     if comp_result is None:
-        return check_assert(program, commandsIndex + 1, variables)
-
-    left, right = comp_result
-
-    new_variables: Dict[str, Variable] = variables.copy()
-    new_variables[left.string] = left
-    if right is not None:
-        new_variables[right.string] = right
-    for assignment_command in comparison_command.body:
-        assignment(assignment_command, new_variables)
-    if not check_assert(program, commandsIndex + 1, new_variables):
-        return False
-    
-    left_excepts: List[Variable] = []
-    right_excepts: List[Variable] = []
-    if isinstance(comparison_command.condition.l, str):
-        left_excepts = variables[comparison_command.condition.l].except_var(left)
-    else:
-        left_excepts.append(NOTHING)
-    if isinstance(comparison_command.condition.r, str):
-        right_excepts = variables[comparison_command.condition.r].except_var(right)
-    else:
-        right_excepts.append(NOTHING)
-
-    for left_except in left_excepts:
-        for right_except in right_excepts:
-            new_variables = variables.copy()
-            new_variables[left_except.string] = left_except
-            new_variables[right_except.string] = right_except
-            if not check_assert(program, commandsIndex + 1, new_variables):
-                return False
-    
-    return True
-
-
-def assignment(command: Command, variables: Dict[str, Variable]) -> None:
-    rhs = command.rhs
-    while isinstance(rhs, Expr):
-        if isinstance(rhs.l, str):
-            rhs.l = variables[rhs.l]
-        if isinstance(rhs.r, str):
-            rhs.r = variables[rhs.r]
-        if rhs.op == '+':
-            rhs = rhs.l + rhs.r
-        elif rhs.op == '-':
-            rhs = rhs.l - rhs.r
-    if isinstance(rhs, str):
-        rhs = variables[rhs]
-    if isinstance(rhs, Variable):
-        rhs = rhs.copy()
-        rhs.string = command.lhs
-    if isinstance(rhs, Input):
-        rhs = NOTHING.copy()
-        rhs.set_boundless()
-        rhs.string = command.lhs
-    if isinstance(rhs, int):
-        rhs = Variable(command.lhs, rhs, rhs, rhs, True, True)
-
-    variables[command.lhs] = rhs
-
-
-def check_assert(program: Program, commandsIndex: int, variables: Dict[str, Variable]) -> bool:
-    commands: List[Command] = program.commands
-    postCondition: Comp = program.postCondition
-
-    for i in range(commandsIndex, len(commands)):
-        command = commands[i]
-        if type(command) == If:
-            return branching(program, i, variables)
-        elif type(command) == Assignment:
-            assignment(command, variables)
-
-    print(commandsIndex)
-    for x in variables:
-        print(variables[x])
-    print("------")
-
-    if isinstance(postCondition.l, str):
-        postCondition.l = variables[postCondition.l]
-    if isinstance(postCondition.r, str):
-        postCondition.r = variables[postCondition.r]
-
-    comp_result = comp(variables, postCondition)
+        STATS.count("pruned")
+        return new_variables
+    variables = variables[:]
+    for slot, variable in comp_result:
+        variables[slot] = variable
+    return variables if new_variables is None else join(new_variables, variables)
+
+
+@STATS.timed("branching")
+def branching(program: CompiledProgram, commandsIndex: int, variables: Intervals) -> List[Intervals]:
+    '''
+    The states after the if at commandsIndex, one for each path through it that can be taken
+    '''
+    STATS.count("forks")
+    comparison_command: Branch = program.commands[commandsIndex]
+    condition: Cond = oriented(comparison_command.condition)
+    comp_result: Optional[List[Tuple[int, Variable]]] = comp(variables, condition, program.names)
+    new_variables: Optional[Intervals] = taken(comparison_command, comp_result, variables, program.names)
+    sides: List[Intervals] = [] if new_variables is None else [new_variables]
+
+    if condition.l[0] == SLOT and condition.r[0] == CONSTANT and condition.op != '!=':
+        # The values of a single variable for which the condition doesn't hold are exactly
+        # the parts of its interval left out by comp, each of them is a path of its own
+        slot: int = condition.l[1]
+        original: Variable = variables[slot]
+        excepts: List[Variable] = [original] if comp_result is None else original.except_var(comp_result[0][1])
+        for left_except in excepts:
+            if not left_except.possible():
+                continue
+            new_variables = variables[:]
+            new_variables[slot] = left_except
+            sides.append(new_variables)
+        return sides
+
+    # Otherwise narrow the intervals by the opposite condition
+    opposite: Cond = Cond(condition.opposite, condition.l, condition.r)
+    comp_result = comp(variables, opposite, program.names)
     if comp_result is None:
-        return False
-    left, right = comp_result
-
-    return (isinstance(left, int) or left is None or postCondition.l.except_var(left) == []) \
-        and (isinstance(right, int) or right is None or postCondition.r.except_var(right) == [])
-
-
-def main(program: Program) -> bool:
-    variables: Dict[str, Variable] = {}
-    res: bool = check_assert(program, 0, variables)
-    return res
-    
-
-for i in range(4, 30):
-    if i in (3, 7, 8, 9):
-        continue
-    print("Test", i)
-    print("-------------------------------------------")
-    print(main(parse_file(f"programs/other/{i}.txt")))
-    print("-------------------------------------------")
+        STATS.count("pruned")
+        return sides
+    for slot, variable in comp_result:
+        variables[slot] = variable
+    sides.append(variables)
+    return sides
+
+
+@STATS.timed("assignment")
+def assignment(command: Assign, variables: Intervals, names: Tuple[str, ...]) -> None:
+    value = operand(command.l, variables, names)
+    if isinstance(value, int):
+        value = Variable.from_bounds("", value, value)
+    if command.op != COPY:
+        right = operand(command.r, variables, names)
+        if isinstance(right, int):
+            right = Variable.from_bounds("", right, right)
+        if command.op == ADD:
+            value = value + right
+        elif command.op == SUB:
+            value = value - right
+        else:
+            value = value * right
+
+    variables[command.slot] = value.normalized(names[command.slot])
+
+
+def check_assert(program: CompiledProgram, commandsIndex: int, variables: Intervals, strategy: str = "dfs",
+                 max_frontier: Optional[int] = None) -> bool:
+    '''
+    Split mode - explore the paths from command commandsIndex on, see worklist.py for strategy and max_frontier.\n
+    A state is the index of its next command, the intervals and the number of ifs on its path
+    '''
+    commands: Tuple[Union[Assign, Branch], ...] = program.commands
+
+    def step(state: Tuple[int, Intervals, int]) -> Optional[List[Tuple[int, Intervals, int]]]:
+        commandsIndex, variables, depth = state
+        for i in range(commandsIndex, len(commands)):
+            command = commands[i]
+            if type(command) == Branch:
+                return [(i + 1, side, depth + 1) for side in branching(program, i, variables)]
+            assignment(command, variables, program.names)
+        return [] if post_holds(program, variables) else None
+
+    return explore((commandsIndex, variables, 0), step, strategy, lambda state: state[2], max_frontier)
+
+
+def post_holds(program: CompiledProgram, variables: Intervals) -> bool:
+    STATS.count("paths")
+    left = operand(program.post.l, variables, program.names)
+    right = operand(program.post.r, variables, program.names)
+    if isinstance(left, int):
+        left = Variable.from_bounds("", left, left)
+    if isinstance(right, int):
+        right = Variable.from_bounds("", right, right)
+    return holds(program.post.op, left, right)
+
+
+def check_assert_joined(program: CompiledProgram, variables: Intervals) -> bool:
+    '''
+    Join mode - a single pass over the commands, linear in the length of the program
+    '''
+    for command in program.commands:
+        if type(command) == Branch:
+            variables = joined_branching(command, variables, program.names)
+            if variables is None:
+                # No path gets past this if
+                return True
+        else:
+            assignment(command, variables, program.names)
+    return post_holds(program, variables)
+
+
+MODES = ("split", "join")
+
+
+def main(program: Program, domain: str = "intervals", mode: str = "split", strategy: str = "dfs",
+         max_frontier: Optional[int] = None) -> bool:
+    '''
+    Check if the analysis proves the assertion on every path.\n
+    domain "octagons" also keeps the relations between pairs of variables (octagons.py, needs numpy).\n
+    mode "split" follows every side of every if on its own, "join" merges the sides back after each if -
+    linear in the length of the program, but it proves less.\n
+    strategy and max_frontier are the order of the paths in split mode, see worklist.py
+    '''
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode}")
+    if domain == "octagons":
+        import octagons
+        return octagons.main(program, mode, strategy, max_frontier)
+    compiled: CompiledProgram = compile_program(program)
+    if mode == "join":
+        return check_assert_joined(compiled, compiled.environment())
+    return check_assert(compiled, 0, compiled.environment(), strategy, max_frontier)
+
+
+if __name__ == "__main__":
+    for i in range(1, 31):
+        print("Test", i)
+        print("-------------------------------------------")
+        print(main(parse_file(f"programs/other/{i}.txt")))
+        print("-------------------------------------------")
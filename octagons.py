@@ -0,0 +1,348 @@
+import sys
+
+import numpy as np
+
+from ir import *
+from parser_1 import *
+from stats import STATS
+from typing import List, Optional, Tuple, Union
+from worklist import explore
+
+# Octagon domain for the path analysis of number_intervals.
+# Intervals lose every relation between variables, so x == z can't be proved after x and z were
+# both increased by 2. An octagon keeps a bound on every +-x +-y of 2 variables (Mine's octagon
+# domain) in a difference bound matrix over the values V[2k] = v_k and V[2k + 1] = -v_k of the slots:
+# m[i, j] is an upper bound of V[i] - V[j], so v_k <= c is m[2k, 2k + 1] == 2c and x - y <= c is
+# m[2x, 2y] (together with the equivalent m[2y + 1, 2x + 1]).
+# States are always kept closed - the tightest bounds implied by the matrix - so the bounds of a
+# variable, a difference or a sum can be read off it directly. Closure is Floyd-Warshall with
+# every step vectorized over the whole matrix, followed by the integer tightening and strengthening steps.
+# numpy is only needed for this domain, number_intervals imports this module when it's asked for octagons.
+
+INF = np.inf
+
+
+class Octagon:
+    '''
+    The octagon of n slots, assigned[k] tells if slot k has a value yet
+    '''
+    __slots__ = ("m", "bar", "assigned")
+
+    def __init__(self, m: np.ndarray, assigned: List[bool]):
+        self.m: np.ndarray = m
+        # bar[i] is the index of -V[i]
+        self.bar: np.ndarray = np.arange(m.shape[0]) ^ 1
+        self.assigned: List[bool] = assigned
+
+    @staticmethod
+    def top(n: int) -> 'Octagon':
+        m: np.ndarray = np.full((2 * n, 2 * n), INF)
+        np.fill_diagonal(m, 0)
+        return Octagon(m, [False] * n)
+
+    def copy(self) -> 'Octagon':
+        return Octagon(self.m.copy(), self.assigned[:])
+
+    def join(self, o: 'Octagon') -> 'Octagon':
+        '''
+        The smallest octagon holding both, the weaker of each pair of bounds - it stays closed
+        '''
+        return Octagon(np.maximum(self.m, o.m), [a and b for a, b in zip(self.assigned, o.assigned)])
+
+    def close(self) -> bool:
+        '''
+        Close the matrix in place, returns False if it turns out to have no integer points
+        '''
+        m: np.ndarray = self.m
+        for k in range(m.shape[0]):
+            np.minimum(m, m[:, k, None] + m[None, k, :], out=m)
+        if (np.diagonal(m) < 0).any():
+            return False
+        # 2 * v <= c holds for integers iff 2 * v <= 2 * floor(c / 2)
+        rows: np.ndarray = np.arange(m.shape[0])
+        unary: np.ndarray = np.floor(m[rows, self.bar] / 2) * 2
+        # V[i] - V[j] == (2 * V[i] + (-2 * V[j])) / 2
+        np.minimum(m, (unary[:, None] + unary[self.bar][None, :]) / 2, out=m)
+        if (np.diagonal(m) < 0).any():
+            return False
+        np.fill_diagonal(m, 0)
+        return True
+
+    def add(self, i: int, j: int, c: float) -> None:
+        '''
+        Add V[i] - V[j] <= c, the matrix has to be closed again afterwards
+        '''
+        self.m[i, j] = min(self.m[i, j], c)
+        self.m[self.bar[j], self.bar[i]] = min(self.m[self.bar[j], self.bar[i]], c)
+
+    def forget(self, k: int) -> None:
+        '''
+        Drop everything known about slot k, the matrix stays closed
+        '''
+        self.m[2 * k:2 * k + 2, :] = INF
+        self.m[:, 2 * k:2 * k + 2] = INF
+        self.m[2 * k, 2 * k] = self.m[2 * k + 1, 2 * k + 1] = 0
+
+    def bounds(self, k: int) -> Tuple[float, float]:
+        return -self.m[2 * k + 1, 2 * k] / 2, self.m[2 * k, 2 * k + 1] / 2
+
+    def read(self, x: Operand, names: Tuple[str, ...]) -> Operand:
+        '''
+        Check that a slot operand has a value, constant slots are turned into constants
+        '''
+        kind, value = x
+        if kind == SLOT:
+            if not self.assigned[value]:
+                raise KeyError(names[value])
+            lower, upper = self.bounds(value)
+            if lower == upper:
+                return CONSTANT, int(lower)
+        return x
+
+    def difference(self, l: Operand, r: Operand) -> Tuple[float, float]:
+        '''
+        Bounds of l - r
+        '''
+        if l[0] == INPUT or r[0] == INPUT:
+            return -INF, INF
+        if l[0] == CONSTANT and r[0] == CONSTANT:
+            return l[1] - r[1], l[1] - r[1]
+        if l[0] == CONSTANT:
+            lower, upper = self.bounds(r[1])
+            return l[1] - upper, l[1] - lower
+        if r[0] == CONSTANT:
+            lower, upper = self.bounds(l[1])
+            return lower - r[1], upper - r[1]
+        a, b = l[1], r[1]
+        if a == b:
+            return 0, 0
+        return -self.m[2 * b, 2 * a], self.m[2 * a, 2 * b]
+
+    def sum(self, a: int, b: int) -> Tuple[float, float]:
+        '''
+        Bounds of v_a + v_b
+        '''
+        return -self.m[2 * a + 1, 2 * b], self.m[2 * a, 2 * b + 1]
+
+    def at_most(self, l: Operand, r: Operand, c: int) -> None:
+        '''
+        Add l - r <= c
+        '''
+        if l[0] == INPUT or r[0] == INPUT:
+            # A fresh input can always be chosen to satisfy it
+            return
+        if l[0] == SLOT and r[0] == SLOT:
+            self.add(2 * l[1], 2 * r[1], c)
+        elif l[0] == SLOT:
+            self.add(2 * l[1], 2 * l[1] + 1, 2 * (c + r[1]))
+        elif r[0] == SLOT:
+            self.add(2 * r[1] + 1, 2 * r[1], 2 * (c - l[1]))
+
+    def guard(self, condition: Cond, names: Tuple[str, ...]) -> Optional['Octagon']:
+        '''
+        The part of the octagon where condition holds, None if there is none
+        '''
+        l: Operand = self.read(condition.l, names)
+        r: Operand = self.read(condition.r, names)
+        lower, upper = self.difference(l, r)
+        if holds(condition.op, lower, upper):
+            return self.copy()
+        if holds(condition.opposite, lower, upper):
+            return None
+        state: Octagon = self.copy()
+        op: str = condition.op
+        if op == '<':
+            state.at_most(l, r, -1)
+        elif op == '<=':
+            state.at_most(l, r, 0)
+        elif op == '>':
+            state.at_most(r, l, -1)
+        elif op == '>=':
+            state.at_most(r, l, 0)
+        elif op == '==':
+            state.at_most(l, r, 0)
+            state.at_most(r, l, 0)
+        elif upper == 0:
+            state.at_most(l, r, -1)
+        elif lower == 0:
+            state.at_most(r, l, -1)
+        return state if state.close() else None
+
+    def set_bounds(self, k: int, lower: float, upper: float) -> None:
+        self.forget(k)
+        if upper != INF:
+            self.add(2 * k, 2 * k + 1, 2 * upper)
+        if lower != -INF:
+            self.add(2 * k + 1, 2 * k, -2 * lower)
+        self.close()
+
+    def assign_unit(self, k: int, sign: int, b: int, c: int) -> None:
+        '''
+        v_k = sign * v_b + c
+        '''
+        if b == k:
+            if sign < 0:
+                # Swap v_k and -v_k
+                swap: np.ndarray = np.arange(self.m.shape[0])
+                swap[2 * k], swap[2 * k + 1] = 2 * k + 1, 2 * k
+                self.m = self.m[np.ix_(swap, swap)]
+            # Shift v_k by c
+            self.m[2 * k, :] += c
+            self.m[:, 2 * k] -= c
+            self.m[2 * k + 1, :] -= c
+            self.m[:, 2 * k + 1] += c
+            return
+        self.forget(k)
+        if sign > 0:
+            self.add(2 * k, 2 * b, c)
+            self.add(2 * b, 2 * k, -c)
+        else:
+            self.add(2 * k, 2 * b + 1, c)
+            self.add(2 * b + 1, 2 * k, -c)
+        self.close()
+
+
+def holds(op: str, lower: float, upper: float) -> bool:
+    '''
+    Check if "l op r" holds for every value of l - r between lower and upper.\n
+    The bounds are read off the matrix as numpy floats, the result is a Python bool either way
+    '''
+    if op == '<':
+        return bool(upper < 0)
+    if op == '<=':
+        return bool(upper <= 0)
+    if op == '>':
+        return bool(lower > 0)
+    if op == '>=':
+        return bool(lower >= 0)
+    if op == '==':
+        return bool(lower == upper == 0)
+    return bool(upper < 0 or lower > 0)
+
+
+def product(lower: float, upper: float, o_lower: float, o_upper: float) -> Tuple[float, float]:
+    # 0 * inf is 0 - the infinite bound stands for arbitrarily large finite values
+    products: List[float] = [0 if a == 0 or b == 0 else a * b for a in (lower, upper) for b in (o_lower, o_upper)]
+    return min(products), max(products)
+
+
+@STATS.timed("assignment")
+def assignment(command: Assign, state: Octagon, names: Tuple[str, ...]) -> None:
+    k: int = command.slot
+    l: Operand = state.read(command.l, names)
+    r: Optional[Operand] = None if command.op == COPY else state.read(command.r, names)
+    state.assigned[k] = True
+    if l[0] == INPUT or (r is not None and r[0] == INPUT):
+        state.forget(k)
+        return
+
+    if command.op == COPY:
+        if l[0] == CONSTANT:
+            state.set_bounds(k, l[1], l[1])
+        else:
+            state.assign_unit(k, 1, l[1], 0)
+    elif command.op == MUL:
+        if l[0] == CONSTANT and r[0] == CONSTANT:
+            state.set_bounds(k, l[1] * r[1], l[1] * r[1])
+        elif l[0] == CONSTANT and abs(l[1]) == 1:
+            state.assign_unit(k, l[1], r[1], 0)
+        elif r[0] == CONSTANT and abs(r[1]) == 1:
+            state.assign_unit(k, r[1], l[1], 0)
+        else:
+            left: Tuple[float, float] = (l[1], l[1]) if l[0] == CONSTANT else state.bounds(l[1])
+            right: Tuple[float, float] = (r[1], r[1]) if r[0] == CONSTANT else state.bounds(r[1])
+            state.set_bounds(k, *product(*left, *right))
+    else:
+        sign: int = 1 if command.op == ADD else -1
+        if l[0] == CONSTANT and r[0] == CONSTANT:
+            state.set_bounds(k, l[1] + sign * r[1], l[1] + sign * r[1])
+        elif l[0] == CONSTANT:
+            state.assign_unit(k, sign, r[1], l[1])
+        elif r[0] == CONSTANT:
+            state.assign_unit(k, 1, l[1], sign * r[1])
+        elif sign > 0:
+            state.set_bounds(k, *state.sum(l[1], r[1]))
+        else:
+            state.set_bounds(k, *state.difference(l, r))
+
+
+def sides(command: Branch, state: Octagon, names: Tuple[str, ...]) -> List[Optional[Octagon]]:
+    '''
+    The states after the body of the if and after skipping it, None for a side that can't be taken
+    '''
+    result: List[Optional[Octagon]] = []
+    for condition in (command.condition, Cond(command.condition.opposite, command.condition.l, command.condition.r)):
+        branch: Optional[Octagon] = state.guard(condition, names)
+        if branch is None:
+            STATS.count("pruned")
+        elif condition is command.condition:
+            for assignment_command in command.body:
+                assignment(assignment_command, branch, names)
+        result.append(branch)
+    return result
+
+
+@STATS.timed("branching")
+def branching(program: CompiledProgram, commandsIndex: int, state: Octagon) -> List[Octagon]:
+    STATS.count("forks")
+    return [branch for branch in sides(program.commands[commandsIndex], state, program.names) if branch is not None]
+
+
+def check_assert(program: CompiledProgram, commandsIndex: int, state: Octagon, strategy: str = "dfs",
+                 max_frontier: Optional[int] = None) -> bool:
+    '''
+    Split mode - explore the paths like number_intervals.check_assert
+    '''
+    commands: Tuple[Union[Assign, Branch], ...] = program.commands
+
+    def step(path: Tuple[int, Octagon, int]) -> Optional[List[Tuple[int, Octagon, int]]]:
+        commandsIndex, state, depth = path
+        for i in range(commandsIndex, len(commands)):
+            command = commands[i]
+            if type(command) == Branch:
+                return [(i + 1, branch, depth + 1) for branch in branching(program, i, state)]
+            assignment(command, state, program.names)
+        return [] if post_holds(program, state) else None
+
+    return explore((commandsIndex, state, 0), step, strategy, lambda path: path[2], max_frontier)
+
+
+def post_holds(program: CompiledProgram, state: Octagon) -> bool:
+    STATS.count("paths")
+    post: Cond = program.post
+    return bool(holds(post.op, *state.difference(state.read(post.l, program.names), state.read(post.r, program.names))))
+
+
+def check_assert_joined(program: CompiledProgram, state: Octagon) -> bool:
+    '''
+    Join mode - both sides of every if are joined back into one state
+    '''
+    for command in program.commands:
+        if type(command) == Branch:
+            STATS.count("forks")
+            branch, other = sides(command, state, program.names)
+            if branch is None or other is None:
+                if branch is None and other is None:
+                    # No path gets past this if
+                    return True
+                state = other if branch is None else branch
+            else:
+                state = branch.join(other)
+        else:
+            assignment(command, state, program.names)
+    return post_holds(program, state)
+
+
+def main(program: Program, mode: str = "split", strategy: str = "dfs", max_frontier: Optional[int] = None) -> bool:
+    '''
+    Check if the octagons prove the assertion on every path, mode is one of number_intervals.MODES
+    '''
+    compiled: CompiledProgram = compile_program(program)
+    if mode == "join":
+        return check_assert_joined(compiled, Octagon.top(len(compiled.names)))
+    return check_assert(compiled, 0, Octagon.top(len(compiled.names)), strategy, max_frontier)
+
+
+if __name__ == "__main__":
+    for filename in sys.argv[1:]:
+        print(filename, main(parse_file(filename)))
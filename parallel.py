@@ -0,0 +1,59 @@
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from main import *
+from typing import Set
+
+# Fans the leaf queries of a single program out to a pool of worker processes.
+# Once a leaf's path is known its query doesn't depend on any other leaf, so the main process
+# only explores the path tree and streams the constraint sets of the leaves to the workers.
+# Every worker solves them in its own z3 context, the first satisfiable leaf is a counterexample
+# and stops the whole exploration.
+
+
+def solve_leaf(comparisons: Comparisons, timeout: Optional[float] = None) -> bool:
+    '''
+    Worker side - check if one leaf's constraint set has a solution, z3 gets timeout seconds for it
+    '''
+    return PathSolver(cache=sat_cache, budget=Budget(timeout)).leaf_satisfiable(comparisons)
+
+
+def is_assert_true(program: Program, jobs: Optional[int] = None, max_pending: Optional[int] = None,
+                   budget: Optional[Budget] = None) -> bool:
+    '''
+    Verify program by solving its leaf queries on jobs worker processes.\n
+    At most max_pending queries (default 4 per worker) are queued at a time, so exploring
+    the path tree never gets far ahead of the workers.\n
+    Raises Unknown when budget runs out, or a leaf can't be decided within it
+    '''
+    jobs = jobs or os.cpu_count() or 1
+    max_pending = max_pending or 4 * jobs
+    executor = ProcessPoolExecutor(jobs)
+    pending: Set[Future] = set()
+
+    def counterexample_found(done: Set[Future]) -> bool:
+        return any(future.result() for future in done)
+
+    try:
+        for query in leaf_queries(program, 0, {}, []):
+            timeout: Optional[float] = None if budget is None else budget.query_timeout()
+            pending.add(executor.submit(solve_leaf, query, timeout))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if counterexample_found(done):
+                    return False
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if counterexample_found(done):
+                return False
+        return True
+    finally:
+        # Drop the queries that haven't started yet, the running ones finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    for filename in sys.argv[1:]:
+        print(filename, "ok" if is_assert_true(parse_file(filename)) else "nok")
@@ -1,6 +1,7 @@
 import sys
 
-from typing import List, Union, Iterator, Optional, Set
+from stats import STATS
+from typing import List, Union, Iterable, Iterator, Optional, Set
 
 
 class Input:
@@ -101,15 +102,18 @@ class Program:
         commands: The body of the program.
         postCondition: The condition that should hold at the end.
         variables: The list of variables used by the program.
+        line: The line of the source on which the program starts, if known.
     """
 
 
     def __init__(self, commands: List[Command],
                  postCondition: Comp,
-                 variables: Set[Var]):
+                 variables: Set[Var],
+                 line: Optional[int] = None):
         self.commands = commands
         self.postCondition = postCondition
         self.variables = variables
+        self.line = line
 
     def __str__(self):
         commands = map(str, self.commands)
@@ -238,6 +242,100 @@ class Parser:
         return Program(commands, self.postCondition, self.variables)
 
 
+EXPR_OPS = frozenset(("+", "-", "*"))
+COMP_OPS = frozenset(("==", "<", ">", "<=", ">=", "!="))
+
+
+def parse_token(token: str) -> Value:
+    if token == "input()":
+        return Input()
+    if token[0] in "+-0123456789":
+        try:
+            return int(token)
+        except ValueError:
+            pass
+    return token
+
+
+def parse_programs(lines: Iterable[str], separator: str = "---") -> Iterator[Program]:
+    """Parses a stream of programs, one after another, and yields them as they
+    are read. Every program ends with its assertion, so the programs don't need
+    to be separated, but empty lines and lines holding only the separator
+    between them are skipped. Every program gets the number of the line it
+    starts on, errors are raised as RuntimeError with the number of the line.
+
+    Each line is split into tokens once and handled right away, without the
+    lookahead of Parser.
+    """
+
+    commands: List[Command] = []
+    variables: Set[Var] = set()
+    start: Optional[int] = None
+    condition: Optional[Comp] = None
+    body: Optional[List[Assignment]] = None
+
+    def cond(tokens: List[str], number: int) -> Comp:
+        if len(tokens) != 3:
+            raise RuntimeError(f"Line {number}: Invalid condition {tokens}")
+        if tokens[1] not in COMP_OPS:
+            raise RuntimeError(f"Line {number}: Unsupported comparison {tokens[1]}")
+        return Comp(tokens[1], parse_token(tokens[0]), parse_token(tokens[2]))
+
+    for number, line in enumerate(lines, 1):
+        tokens = line.split()
+        if not tokens or (start is None and len(tokens) == 1 and tokens[0] == separator):
+            continue
+        if start is None:
+            start = number
+        head = tokens[0]
+
+        if len(tokens) > 2 and tokens[1] == "=":
+            if len(tokens) == 3:
+                rhs: Union[Value, Expr] = parse_token(tokens[2])
+            elif len(tokens) == 5:
+                if tokens[3] not in EXPR_OPS:
+                    raise RuntimeError(f"Line {number}: Unsupported operation {tokens[3]}")
+                rhs = Expr(tokens[3], parse_token(tokens[2]), parse_token(tokens[4]))
+            else:
+                raise RuntimeError(f"Line {number}: Invalid expression {tokens[2:]}")
+            variables.add(head)
+            (commands if body is None else body).append(Assignment(head, rhs))
+        elif head == "if":
+            if body is not None:
+                raise RuntimeError(f"Line {number}: Nested if-then blocks are not allowed")
+            if len(tokens) != 5:
+                raise RuntimeError(f"Line {number}: Invalid if {tokens}")
+            condition = cond(tokens[1:4], number)
+            body = []
+        elif head == "end" and len(tokens) == 1:
+            if body is None:
+                raise RuntimeError(f"Line {number}: end without an if")
+            commands.append(If(condition, body))
+            body = None
+        elif head == "assert":
+            if body is not None:
+                raise RuntimeError(f"Line {number}: Unexpected assert inside an if")
+            yield Program(commands, cond(tokens[1:], number), variables, start)
+            commands, variables, start = [], set(), None
+        else:
+            raise RuntimeError(f"Line {number}: Unexpected line {tokens}")
+
+    if start is not None:
+        raise RuntimeError(f"Line {start}: Program without an assertion")
+
+
+def parse_single(lines: Iterable[str]) -> Program:
+    programs = parse_programs(lines)
+    try:
+        program = next(programs)
+    except StopIteration:
+        raise RuntimeError("Program without an assertion")
+    if next(programs, None) is not None:
+        raise RuntimeError("No further commands are allowed after a postcondition")
+    return program
+
+
+@STATS.timed("parse_file")
 def parse_file(filename: str) -> Program:
     """Parses the input program and returns its representation as Program
     object. Also parses the post-condition and passes it as an attribute of the
@@ -245,8 +343,26 @@ def parse_file(filename: str) -> Program:
     """
 
     with open(filename) as f:
-        parser = Parser()
-        return parser.parse_program(f)
+        return parse_single(f)
+
+
+@STATS.timed("parse_file")
+def parse_text(text: str) -> Program:
+    """Parses a program given as a string, the same way as parse_file."""
+
+    return parse_single(text.splitlines())
+
+
+def parse_corpus(filename: str, separator: str = "---") -> Iterator[Program]:
+    """Yields the programs of a file holding any number of them, see
+    parse_programs. The filename - reads standard input.
+    """
+
+    if filename == "-":
+        yield from parse_programs(sys.stdin, separator)
+    else:
+        with open(filename) as f:
+            yield from parse_programs(f, separator)
 
 if __name__ == "__main__":
     program = parse_file(sys.argv[1])
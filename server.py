@@ -0,0 +1,202 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import socketserver
+import stat
+import sys
+import threading
+
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from main import Budget, verify_program
+from parser_1 import *
+from stats import collect
+from typing import Any, Callable, Dict, List, Optional
+
+# The engines are imported before the workers are forked, so no request pays for importing them
+import merging
+import tiered
+
+# Long-running verification server.
+# Starting Python and importing z3 takes far longer than verifying a small program, so editors and CI
+# keep one server running and send it programs over a Unix socket or stdin.
+# Requests and responses are JSON objects, one per line:
+#   {"id": 1, "program": "x = input()\nassert x == x"}
+#   {"id": 1, "verdict": "ok", "counterexample": null}
+# A request can also set "engine", "prune_every", "stats" (adds the stats.py counters to the response),
+# "timeout" (seconds for each z3 query) and "budget" (seconds for the program) - out of time, the verdict is "unknown".
+# Requests are verified concurrently on a pool of worker processes, so the responses come in the order
+# the programs are done - id (any JSON value) tells which request a response answers.
+# With -j 1 they are verified in the server process, one at a time even when several clients are connected.
+
+ENGINES = ("paths", "merging", "tiered")
+
+Response = Dict[str, Any]
+
+
+def verify_request(text: str, engine: str, prune_every: int, with_stats: bool,
+                   budget: Optional[Budget] = None) -> Response:
+    '''
+    Worker side - parse and verify one program, returns the response without its id
+    '''
+    # stdout may be the channel of the responses, the engines' messages go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            program: Program = parse_text(text)
+        except Exception as e:
+            return {"verdict": f"error: {type(e).__name__}: {e}", "counterexample": None}
+        if not with_stats:
+            verdict, counterexample = verify_program(program, engine, prune_every, 1, (), budget)
+            return {"verdict": verdict, "counterexample": counterexample}
+        (verdict, counterexample), recorded = collect(verify_program, program, engine, prune_every, 1, (), budget)
+        return {"verdict": verdict, "counterexample": counterexample, "stats": recorded}
+
+
+class Verifier:
+    '''
+    Verifies requests on jobs worker processes, or right in the calling thread when jobs is 1.\n
+    z3, STATS and sat_cache are not thread safe, so in-process verifications of several connections
+    take turns holding lock.\n
+    engine and prune_every are the defaults for requests that don't set them
+    '''
+    def __init__(self, jobs: int = 1, engine: str = "paths", prune_every: int = 0):
+        self.engine: str = engine
+        self.prune_every: int = prune_every
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.lock: threading.Lock = threading.Lock()
+        if jobs > 1:
+            self.executor = ProcessPoolExecutor(jobs)
+            # Start the workers now instead of on the first requests
+            for future in [self.executor.submit(int) for _ in range(jobs)]:
+                future.result()
+
+    def handle(self, line: str, respond: Callable[[Response], None]) -> Optional[Future]:
+        '''
+        Verify the request in line and pass the response to respond.\n
+        When the request goes to a worker, returns a future that is done once it has been responded to
+        '''
+        request_id: Any = None
+        try:
+            request: Dict[str, Any] = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request is not a JSON object")
+            request_id = request.get("id")
+            text: str = request["program"]
+            if not isinstance(text, str):
+                raise ValueError("program is not a string")
+            engine: str = request.get("engine", self.engine)
+            if engine not in ENGINES:
+                raise ValueError(f"Unknown engine {engine}")
+            prune_every: int = int(request.get("prune_every", self.prune_every))
+            with_stats: bool = bool(request.get("stats", False))
+            budget: Optional[Budget] = None
+            if request.get("timeout") is not None or request.get("budget") is not None:
+                budget = Budget(None if request.get("timeout") is None else float(request["timeout"]),
+                                None if request.get("budget") is None else float(request["budget"]))
+        except (ValueError, KeyError, TypeError) as e:
+            respond({"id": request_id, "verdict": f"error: {type(e).__name__}: {e}", "counterexample": None})
+            return None
+
+        if self.executor is None:
+            with self.lock:
+                response: Response = verify_request(text, engine, prune_every, with_stats, budget)
+            respond({"id": request_id, **response})
+            return None
+
+        responded: Future = Future()
+
+        def done(future: Future) -> None:
+            try:
+                response = future.result()
+            except Exception as e:
+                response = {"verdict": f"error: {type(e).__name__}: {e}", "counterexample": None}
+            try:
+                respond({"id": request_id, **response})
+            finally:
+                responded.set_result(None)
+
+        self.executor.submit(verify_request, text, engine, prune_every, with_stats, budget).add_done_callback(done)
+        return responded
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def line_writer(stream, lock: threading.Lock) -> Callable[[Response], None]:
+    '''
+    respond function writing each response as one line of stream, safe to call from several threads
+    '''
+    def respond(response: Response) -> None:
+        line: str = json.dumps(response) + "\n"
+        with lock:
+            try:
+                stream.write(line)
+                stream.flush()
+            except OSError:
+                # The client is gone
+                pass
+    return respond
+
+
+def serve_lines(verifier: Verifier, lines, respond: Callable[[Response], None]) -> None:
+    '''
+    Handle every non-empty line as a request and return once all of them are responded to
+    '''
+    pending: List[Future] = []
+    for line in lines:
+        if line.strip():
+            responded: Optional[Future] = verifier.handle(line, respond)
+            if responded is not None:
+                pending.append(responded)
+                pending = [future for future in pending if not future.done()]
+    wait(pending)
+
+
+class ConnectionHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        lines = io.TextIOWrapper(self.rfile, encoding="utf-8", errors="replace")
+        stream = io.TextIOWrapper(self.wfile, encoding="utf-8")
+        serve_lines(self.server.verifier, lines, line_writer(stream, threading.Lock()))
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, verifier: Verifier):
+        # A socket left behind by a previous server would make bind fail
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+        self.verifier: Verifier = verifier
+        super().__init__(path, ConnectionHandler)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Verify programs sent as JSON lines over stdin or a Unix socket.")
+    parser.add_argument("--socket", metavar="PATH", help="listen on a Unix socket instead of reading stdin")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes, 1 verifies in the server process (default: number of CPUs)")
+    parser.add_argument("--engine", choices=ENGINES, default="paths", help="engine for requests that don't set one")
+    parser.add_argument("--prune-every", type=int, default=0,
+                        help="prune_every for requests that don't set it")
+    args = parser.parse_args(argv)
+
+    verifier = Verifier(args.jobs, args.engine, args.prune_every)
+    try:
+        if args.socket is None:
+            serve_lines(verifier, sys.stdin, line_writer(sys.stdout, threading.Lock()))
+        else:
+            with UnixServer(args.socket, verifier) as server:
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    os.unlink(args.socket)
+    finally:
+        verifier.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import sys
+
+from parser_1 import *
+from stats import STATS
+from typing import List, Optional, Set, Tuple, Union
+
+# Cone of influence slicing.
+# An if whose body only assigns variables that never flow into the assertion still doubles the paths
+# main.py explores. Walking the program backwards from postCondition keeps only the assignments to
+# variables the assertion (still) depends on, and the ifs whose body keeps at least one of them - the
+# variables of their condition then become dependencies too, since they decide if the body runs.
+# Reading a variable that has no value yet fails, so a command that may do that is kept together
+# with everything it reads, and a program that fails still does after slicing.
+# Every if removed halves the path tree of main.py, the factor it shrank by is the sliced_paths_factor stat.
+
+# (index of the command, index in the body of an if or None for the command itself)
+Position = Tuple[int, Optional[int]]
+
+
+def reads(x: Union[Value, Expr, Comp]) -> Set[str]:
+    '''
+    The variables read by a value, an expression or a comparison
+    '''
+    if isinstance(x, (Expr, Comp)):
+        return reads(x.l) | reads(x.r)
+    if isinstance(x, str):
+        return {x}
+    return set()
+
+
+def may_fail(commands: List[Command]) -> Set[Position]:
+    '''
+    The commands that may read a variable before it's assigned on some path
+    '''
+    result: Set[Position] = set()
+    assigned: Set[str] = set()
+    for i, command in enumerate(commands):
+        if isinstance(command, If):
+            if not reads(command.condition) <= assigned:
+                result.add((i, None))
+            # The body may not run, what it assigns is only known to have a value inside of it
+            assigned_body: Set[str] = set(assigned)
+            for j, assignment in enumerate(command.body):
+                if not reads(assignment.rhs) <= assigned_body:
+                    result.add((i, j))
+                assigned_body.add(assignment.lhs)
+        else:
+            if not reads(command.rhs) <= assigned:
+                result.add((i, None))
+            assigned.add(command.lhs)
+    return result
+
+
+def slice_program(program: Program) -> Program:
+    '''
+    The program without the commands that can't affect its assertion
+    '''
+    failing: Set[Position] = may_fail(program.commands)
+    live: Set[str] = reads(program.postCondition)
+    commands: List[Command] = []
+    removed_commands: int = 0
+    removed_ifs: int = 0
+    for i in reversed(range(len(program.commands))):
+        command = program.commands[i]
+        if isinstance(command, If):
+            live_body: Set[str] = set(live)
+            body: List[Assignment] = []
+            for j in reversed(range(len(command.body))):
+                assignment: Assignment = command.body[j]
+                if assignment.lhs in live_body or (i, j) in failing:
+                    live_body.discard(assignment.lhs)
+                    live_body |= reads(assignment.rhs)
+                    body.append(assignment)
+            removed_commands += len(command.body) - len(body)
+            if body or (i, None) in failing:
+                body.reverse()
+                # Without the body the value from before the if reaches the assertion
+                live |= live_body | reads(command.condition)
+                commands.append(If(command.condition, body))
+            else:
+                removed_ifs += 1
+        elif command.lhs in live or (i, None) in failing:
+            live.discard(command.lhs)
+            live |= reads(command.rhs)
+            commands.append(command)
+        else:
+            removed_commands += 1
+    commands.reverse()
+
+    STATS.count("sliced_commands", removed_commands)
+    STATS.count("sliced_ifs", removed_ifs)
+    STATS.maximum("sliced_paths_factor", 2 ** removed_ifs)
+    variables: Set[str] = reads(program.postCondition)
+    for command in commands:
+        if isinstance(command, If):
+            variables |= reads(command.condition)
+            for assignment in command.body:
+                variables |= {assignment.lhs} | reads(assignment.rhs)
+        else:
+            variables |= {command.lhs} | reads(command.rhs)
+    return Program(commands, program.postCondition, variables, program.line)
+
+
+if __name__ == "__main__":
+    for filename in sys.argv[1:]:
+        print(filename)
+        print(slice_program(parse_file(filename)))
@@ -0,0 +1,227 @@
+import argparse
+import os
+import re
+import shlex
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+from main import *
+from typing import Dict, List, Optional, Set, TextIO, Tuple
+
+# SMT-LIB2 export of the leaf queries of main.py, and offline solving of the exported files.
+# A leaf query is the path condition of a leaf together with the opposite of the assertion and the
+# final values of the variables (main.leaf_queries). The queries of a program are written either as
+# a file per leaf, or as one incremental script in which every if condition is asserted once, in a
+# scope shared by all the leaves below it - the same scopes PathSolver keeps.
+# Any SMT-LIB2 solver binary (z3 -smt2 by default) then solves the files, one process per file on a
+# pool of jobs, and the answers are joined back to the programs and their leaves through the comments
+# every file starts with: "; program <name>" and "; leaf <n>: <path condition>", where the leaves are
+# numbered in the depth first order of main.py.
+# A program is nok if one of its leaves is sat, ok if all of them are unsat and unknown otherwise.
+# Only the verdicts come back, not the counterexamples.
+
+# Symbols of SMT-LIB2 that can't be used as the name of a constant without quoting it
+RESERVED: Set[str] = {"true", "false", "not", "and", "or", "xor", "ite", "let", "forall", "exists", "distinct",
+                      "div", "mod", "abs", "as", "par", "assert", "push", "pop", "_"}
+
+OPERATIONS: Dict[str, str] = {'<': "<", '>': ">", '<=': "<=", '>=': ">=", '==': "="}
+
+ANSWERS: Tuple[str, ...] = ("sat", "unsat", "unknown")
+
+DEFAULT_SOLVER: str = "z3 -smt2"
+
+
+def symbol(name: str) -> str:
+    if name in RESERVED or not re.fullmatch(r"[A-Za-z_][\w.]*", name):
+        return f"|{name}|"
+    return name
+
+
+def integer(value: int) -> str:
+    return str(value) if value >= 0 else f"(- {-value})"
+
+
+def term(polynomial: Polynomial) -> str:
+    '''
+    The polynomial as an SMT-LIB2 term
+    '''
+    terms: List[str] = []
+    for (variable, power), coefficient in polynomial.coefficients.items():
+        factors: List[str] = [symbol(variable.name)] * power
+        if abs(coefficient) != 1:
+            factors.insert(0, integer(coefficient))
+        product: str = factors[0] if len(factors) == 1 else f"(* {' '.join(factors)})"
+        terms.append(f"(- {product})" if coefficient == -1 else product)
+    if polynomial.constant != 0 or not terms:
+        terms.append(integer(polynomial.constant))
+    return terms[0] if len(terms) == 1 else f"(+ {' '.join(terms)})"
+
+
+def formula(comparison: Comparison) -> str:
+    op, lhs, rhs = comparison
+    if op == '!=':
+        return f"(not (= {term(lhs)} {term(rhs)}))"
+    return f"({OPERATIONS[op]} {term(lhs)} {term(rhs)})"
+
+
+def describe(comparisons: Iterable[Comparison]) -> str:
+    '''
+    A path condition on one line, for the comment of its leaf
+    '''
+    return " and ".join(f"{lhs} {op} {rhs}" for op, lhs, rhs in comparisons) or "true"
+
+
+def constants(comparisons: Iterable[Comparison]) -> List[str]:
+    names: Dict[str, None] = {}
+    for _, lhs, rhs in comparisons:
+        for variable, _ in chain(lhs.coefficients, rhs.coefficients):
+            names[variable.name] = None
+    return list(names)
+
+
+def query(comparisons: Comparisons, name: str, leaf: int, path: Comparisons) -> str:
+    '''
+    The leaf query of the leaf-th leaf of program name as a standalone SMT-LIB2 file
+    '''
+    linear: bool = all(power == 1 for _, lhs, rhs in comparisons
+                       for _, power in chain(lhs.coefficients, rhs.coefficients))
+    lines: List[str] = [f"; program {name}", f"; leaf {leaf}: {describe(path)}",
+                        f"(set-logic {'QF_LIA' if linear else 'QF_NIA'})"]
+    lines.extend(f"(declare-const {symbol(constant)} Int)" for constant in constants(comparisons))
+    lines.extend(f"(assert {formula(comparison)})" for comparison in comparisons)
+    lines.append("(check-sat)")
+    return "\n".join(lines) + "\n"
+
+
+def write_script(program: Program, name: str, out: TextIO) -> int:
+    '''
+    Write the leaf queries of program as one incremental script, return the number of leaves
+    '''
+    compiled: CompiledProgram = compile_program(program)
+    out.write(f"; program {name}\n")
+    # Every program variable and every input - the constants of the leaves below a scope can't
+    # be declared inside of it, the declaration would be popped with it
+    for variable in compiled.names:
+        out.write(f"(declare-const {symbol(variable)} Int)\n(declare-const {symbol(variable + '_')} Int)\n")
+    pushed: List[PathCondition] = []
+    leaves: int = 0
+    for path, comparisons in compiled_leaf_paths(compiled, 0, compiled.environment(), PathCondition()):
+        # Pop back to the common prefix of the previous leaf and assert the rest of the path
+        new: List[PathCondition] = []
+        node: PathCondition = path
+        while node.length > 0 and (node.length > len(pushed) or pushed[node.length - 1] is not node):
+            new.append(node)
+            node = node.parent
+        while len(pushed) > node.length:
+            pushed.pop()
+            out.write("(pop 1)\n")
+        for node in reversed(new):
+            pushed.append(node)
+            out.write(f"(push 1)\n(assert {formula(node.comparison)})\n")
+        out.write(f"; leaf {leaves}: {describe(path)}\n(push 1)\n")
+        for comparison in comparisons:
+            out.write(f"(assert {formula(comparison)})\n")
+        out.write("(check-sat)\n(pop 1)\n")
+        leaves += 1
+    return leaves
+
+
+def file_stem(name: str) -> str:
+    return re.sub(r"[^\w.-]", "_", os.path.splitext(name)[0])
+
+
+def export(program: Program, name: str, directory: str, incremental: bool = False) -> List[str]:
+    '''
+    Write the leaf queries of program (called name in the comments) to directory, a file per leaf
+    or one incremental script. Return the files written
+    '''
+    os.makedirs(directory, exist_ok=True)
+    stem: str = file_stem(name)
+    if incremental:
+        filename: str = os.path.join(directory, stem + ".smt2")
+        with open(filename, "w") as f:
+            write_script(program, name, f)
+        return [filename]
+    files: List[str] = []
+    for leaf, (path, comparisons) in enumerate(leaf_paths(program, 0, {}, [])):
+        filename = os.path.join(directory, f"{stem}.{leaf}.smt2")
+        with open(filename, "w") as f:
+            f.write(query(list(path) + comparisons, name, leaf, list(path)))
+        files.append(filename)
+    return files
+
+
+def read_leaves(filename: str) -> Tuple[Optional[str], List[str]]:
+    '''
+    The program and the leaves of an exported file, from its comments
+    '''
+    name: Optional[str] = None
+    leaves: List[str] = []
+    with open(filename) as f:
+        for line in f:
+            if line.startswith("; program "):
+                name = line[len("; program "):].rstrip("\n")
+            elif line.startswith("; leaf "):
+                leaves.append(line[len("; leaf "):].rstrip("\n"))
+    return name, leaves
+
+
+def solve_file(filename: str, solver: List[str], timeout: Optional[float] = None) -> List[str]:
+    '''
+    Run the solver on one file and return its answers to the check-sats, in order.\n
+    A solver that runs out of timeout seconds only answers the check-sats it got to
+    '''
+    try:
+        output = subprocess.run(solver + [filename], capture_output=True, text=True, timeout=timeout).stdout
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout or ""
+        if isinstance(output, bytes):
+            output = output.decode()
+    return [line.strip() for line in output.splitlines() if line.strip() in ANSWERS]
+
+
+def solve(files: List[str], solver: str = DEFAULT_SOLVER, jobs: int = os.cpu_count() or 1,
+          timeout: Optional[float] = None) -> Dict[str, Dict[str, str]]:
+    '''
+    Solve the exported files on jobs solver processes at a time, timeout seconds for each file.\n
+    Return the answers by program and leaf, a leaf the solver gave no answer for is unknown
+    '''
+    command: List[str] = shlex.split(solver)
+    results: Dict[str, Dict[str, str]] = {}
+    # The solvers are processes of their own, the threads only wait for them
+    with ThreadPoolExecutor(jobs) as executor:
+        for filename, answers in zip(files, executor.map(lambda filename: solve_file(filename, command, timeout),
+                                                         files)):
+            name, leaves = read_leaves(filename)
+            answers = answers + ["unknown"] * (len(leaves) - len(answers))
+            results.setdefault(name or filename, {}).update(zip(leaves, answers))
+    return results
+
+
+def verdict(answers: Dict[str, str]) -> str:
+    '''
+    The verdict of a program from the answers of its leaves
+    '''
+    if "sat" in answers.values():
+        return "nok"
+    return "ok" if answers and all(answer == "unsat" for answer in answers.values()) else "unknown"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve exported leaf queries (main.py --smt2) and print the "
+                                                 "verdict of every program they came from.")
+    parser.add_argument("files", nargs="+", help="exported .smt2 files or directories of them")
+    parser.add_argument("--solver", default=DEFAULT_SOLVER, help=f"solver command (default: {DEFAULT_SOLVER})")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of solver processes (default: number of CPUs)")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS", help="time limit of each file")
+    parser.add_argument("--leaves", action="store_true", help="also print the answer of every leaf")
+    args = parser.parse_args()
+    files: List[str] = []
+    for pattern in args.files:
+        files.extend(expand_paths([os.path.join(pattern, "*.smt2")] if os.path.isdir(pattern) else [pattern]))
+    for name, answers in solve(files, args.solver, args.jobs, args.timeout).items():
+        print(name, verdict(answers))
+        if args.leaves:
+            for leaf, answer in answers.items():
+                print("   ", answer, leaf)
@@ -0,0 +1,118 @@
+import functools
+import time
+
+from typing import Any, Callable, Dict, List, Tuple
+
+# Instrumentation of the engines.
+# The hot paths of main.py and number_intervals.py report counters, maxima and timings to STATS,
+# which ignores everything while it's disabled. Times are exclusive - while a timed function
+# calls another timed function, the time goes to the inner one only.
+
+COUNTERS = ("paths", "forks", "pruned", "solver_calls", "linear_checks", "interval_proofs", "octagon_proofs",
+            "sliced_commands", "sliced_ifs", "folded_branches", "components", "sat_cache_hits", "sat_cache_misses")
+TIMERS = ("satisfiable", "assignment", "branching", "parse_file")
+# live_variables is the peak number of Variable objects of the interval analysis, and of variable
+# values in the live value environments (one slot per variable) of main.py.
+# sliced_paths_factor is how many times fewer paths a program has after slicing.py (2 ** removed ifs)
+MAXIMA = ("path_condition_length", "live_variables", "frontier", "sliced_paths_factor")
+
+
+class Stats:
+    def __init__(self):
+        self.enabled: bool = False
+        self.reset()
+
+    def reset(self) -> None:
+        self.counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+        self.times: Dict[str, float] = {name: 0.0 for name in TIMERS}
+        self.maxima: Dict[str, int] = {name: 0 for name in MAXIMA}
+        self.live_variables: int = 0
+        self.timer_stack: List[List[Any]] = []
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def maximum(self, name: str, value: int) -> None:
+        if self.enabled and value > self.maxima.get(name, 0):
+            self.maxima[name] = value
+
+    def variable_created(self) -> None:
+        if self.enabled:
+            self.live_variables += 1
+            self.maximum("live_variables", self.live_variables)
+
+    def variable_freed(self) -> None:
+        # Variables created before stats were enabled can be freed after, don't go below 0
+        if self.enabled and self.live_variables > 0:
+            self.live_variables -= 1
+
+    def start(self, name: str) -> None:
+        now: float = time.perf_counter()
+        if self.timer_stack:
+            outer_name, outer_start = self.timer_stack[-1]
+            self.times[outer_name] = self.times.get(outer_name, 0.0) + now - outer_start
+        self.timer_stack.append([name, now])
+
+    def stop(self) -> None:
+        now: float = time.perf_counter()
+        name, start = self.timer_stack.pop()
+        self.times[name] = self.times.get(name, 0.0) + now - start
+        if self.timer_stack:
+            self.timer_stack[-1][1] = now
+
+    def timed(self, name: str) -> Callable[[Callable], Callable]:
+        '''
+        Decorator adding the run time of a function to the timer name
+        '''
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                self.start(name)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.stop()
+            return wrapper
+        return decorator
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"counters": dict(self.counters), "times": dict(self.times), "maxima": dict(self.maxima)}
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        '''
+        Add the stats of another run (in the format of to_dict) to these
+        '''
+        for name, value in other["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        for name, value in other["times"].items():
+            self.times[name] = self.times.get(name, 0.0) + value
+        for name, value in other["maxima"].items():
+            self.maxima[name] = max(self.maxima.get(name, 0), value)
+
+    def __str__(self) -> str:
+        lines: List[str] = [f"{name}: {value}" for name, value in self.counters.items()]
+        lines += [f"time in {name}: {value:.6f}s" for name, value in self.times.items()]
+        lines += [f"max {name}: {value}" for name, value in self.maxima.items()]
+        lookups: int = self.counters.get("sat_cache_hits", 0) + self.counters.get("sat_cache_misses", 0)
+        if lookups:
+            lines.append(f"sat_cache hit rate: {self.counters['sat_cache_hits'] / lookups:.1%}")
+        return "\n".join(lines)
+
+
+STATS: Stats = Stats()
+
+
+def collect(function: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    '''
+    Run function with fresh, enabled STATS and return its result with what it recorded
+    '''
+    STATS.reset()
+    STATS.enabled = True
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        STATS.enabled = False
+    return result, STATS.to_dict()
@@ -0,0 +1,60 @@
+import sys
+
+import number_intervals
+from parser_1 import *
+from stats import STATS
+from typing import Any, Dict, Optional
+
+# Tiered verification.
+# The interval analysis of number_intervals needs no solver and is much cheaper than z3, but it can
+# only prove assertions - when the intervals of a path don't entail the assertion it may still hold.
+# So every program goes through the intervals first, then through the octagons (when numpy is
+# installed), which also prove assertions relating 2 variables, and only the ones neither can prove
+# are handed to the z3 engine of main.py, which (with z3) is imported the first time it's needed.
+
+
+def proved_by_intervals(program: Program, strategy: str = "dfs", max_frontier: Optional[int] = None) -> bool:
+    try:
+        proved: bool = number_intervals.main(program, strategy=strategy, max_frontier=max_frontier)
+    except RuntimeError:
+        # Unsupported operators are inconclusive
+        return False
+    if proved:
+        STATS.count("interval_proofs")
+    return proved
+
+
+def proved_by_octagons(program: Program, strategy: str = "dfs", max_frontier: Optional[int] = None) -> bool:
+    try:
+        proved: bool = number_intervals.main(program, "octagons", strategy=strategy, max_frontier=max_frontier)
+    except (ImportError, RuntimeError):
+        # Without numpy there is no octagon domain
+        return False
+    if proved:
+        STATS.count("octagon_proofs")
+    return proved
+
+
+def find_counterexample(program: Program, prune_every: int = 0, cache: Optional[Any] = None,
+                        budget: Optional[Any] = None, strategy: str = "dfs",
+                        max_frontier: Optional[int] = None) -> Optional[Dict[str, int]]:
+    '''
+    Find inputs for which the assertion doesn't hold, None if it holds for all inputs.\n
+    prune_every, cache and budget (a main.Budget) are passed to main.find_counterexample when z3 is needed,
+    strategy and max_frontier to every tier
+    '''
+    if proved_by_intervals(program, strategy, max_frontier) or proved_by_octagons(program, strategy, max_frontier):
+        return None
+    import main
+    if budget is not None:
+        budget.check()
+    return main.find_counterexample(program, prune_every, cache, budget, strategy, max_frontier)
+
+
+def is_assert_true(program: Program) -> bool:
+    return find_counterexample(program) is None
+
+
+if __name__ == "__main__":
+    for filename in sys.argv[1:]:
+        print(filename, "ok" if is_assert_true(parse_file(filename)) else "nok")
@@ -0,0 +1,84 @@
+import heapq
+
+from collections import deque
+from itertools import count
+from stats import STATS
+from typing import Any, Callable, Iterator, List, Optional
+
+# Worklist exploration of the path tree.
+# Instead of recursing once per if, the engines keep the states still to be explored in a frontier
+# and take them out one by one, so the length of a program isn't limited by the recursion depth and
+# the order of the paths is a choice:
+#   dfs      - the newest state first, the order of the recursion (and the fewest states kept)
+#   bfs      - the oldest state first, all the paths through the first k ifs before any through k + 1
+#   shortest - the state with the shortest path condition first
+# A frontier can be capped - once it holds max_size states, the states added go to a stack that is
+# explored depth first before anything else, so the frontier only grows past the cap by the depth
+# of the program.
+
+STRATEGIES = ("dfs", "bfs", "shortest")
+
+State = Any
+
+
+class Frontier:
+    '''
+    The states waiting to be explored, key is the length of a state's path condition
+    '''
+    def __init__(self, strategy: str = "dfs", key: Optional[Callable[[State], int]] = None,
+                 max_size: Optional[int] = None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy}")
+        self.strategy: str = strategy
+        self.key: Optional[Callable[[State], int]] = key
+        self.max_size: Optional[int] = max_size
+        self.states: Any = [] if strategy != "bfs" else deque()
+        # States added past the cap
+        self.overflow: List[State] = []
+        # Breaks the ties of the heap in the order the states were added
+        self.counter: Iterator[int] = count()
+
+    def __len__(self) -> int:
+        return len(self.states) + len(self.overflow)
+
+    def add(self, states: List[State]) -> None:
+        '''
+        Add the states of the sides of a fork, they are explored in this order among themselves
+        '''
+        if self.strategy == "dfs":
+            self.states.extend(reversed(states))
+        elif self.max_size is not None and len(self.states) + len(states) > self.max_size:
+            self.overflow.extend(reversed(states))
+        elif self.strategy == "bfs":
+            self.states.extend(states)
+        else:
+            for state in states:
+                heapq.heappush(self.states, (self.key(state), next(self.counter), state))
+        STATS.maximum("frontier", len(self))
+
+    def pop(self) -> State:
+        if self.overflow:
+            return self.overflow.pop()
+        if self.strategy == "dfs":
+            return self.states.pop()
+        if self.strategy == "bfs":
+            return self.states.popleft()
+        return heapq.heappop(self.states)[2]
+
+
+def explore(initial: State, step: Callable[[State], Optional[List[State]]], strategy: str = "dfs",
+            key: Optional[Callable[[State], int]] = None, max_frontier: Optional[int] = None) -> bool:
+    '''
+    Explore the states reachable from initial.\n
+    step runs a state up to its next if and returns the states of its sides, [] at the end of a path
+    where the assertion holds and None where it doesn't - that stops the exploration and returns False
+    '''
+    frontier: Frontier = Frontier(strategy, key, max_frontier)
+    frontier.add([initial])
+    while frontier:
+        successors: Optional[List[State]] = step(frontier.pop())
+        if successors is None:
+            return False
+        if successors:
+            frontier.add(successors)
+    return True